@@ -0,0 +1,187 @@
+"""IVF-flat approximate nearest-neighbour index over unit embeddings (NumPy only).
+
+Vectors are bucketed by their nearest k-means centroid ("list"); a query only
+scans the `nprobe` closest lists. `nprobe` is the recall/latency knob: more
+lists scanned means higher recall and more work. Since nlist grows with the
+index (4*sqrt(n) by default), a fixed nprobe loses recall as the gallery
+grows; `probe_frac` instead scans at least that fraction of the lists.
+Vectors are kept grouped by list in one contiguous block, so probing a list
+is a slice, not a gather copy. Below `exact_max` vectors,
+or before the index is trained, every search is an exact scan.
+"""
+import math
+
+import numpy as np
+
+from face_match import l2_normalize
+
+
+class IVFIndex:
+    def __init__(self, dim: int = 512, nlist: int | None = None, nprobe: int = 8,
+                 exact_max: int = 5000, seed: int = 0, probe_frac: float = 0.0):
+        self.dim, self.nlist, self.nprobe, self.exact_max = dim, nlist, nprobe, exact_max
+        self.seed, self.probe_frac = seed, probe_frac
+        self.centroids: np.ndarray | None = None
+        self._vecs = np.zeros((0, dim), np.float32)
+        self._ids = np.zeros(0, np.int64)
+        self._assign = np.zeros(0, np.int32)
+        self._alive = np.zeros(0, bool)
+        self._n = 0                                  # used rows in the buffers
+        self._row_of: dict[int, int] = {}            # id -> row
+        self._packed = None                          # (vecs, ids, offsets) grouped by list, rebuilt lazily
+
+    def __len__(self):
+        return len(self._row_of)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    # ---------- build / train ----------
+    def build(self, vecs: np.ndarray, ids: np.ndarray | None = None, iters: int = 10):
+        """Reset the index, train centroids on `vecs` and add them."""
+        vecs = l2_normalize(vecs)
+        ids = np.arange(len(vecs)) if ids is None else np.asarray(ids, np.int64)
+        self.__init__(self.dim, self.nlist, self.nprobe, self.exact_max, self.seed, self.probe_frac)
+        if len(vecs) > self.exact_max:
+            self.train(vecs, iters)
+        self.add(vecs, ids)
+        return self
+
+    def train(self, vecs: np.ndarray, iters: int = 10):
+        """Spherical k-means on a sample of `vecs`."""
+        rng = np.random.default_rng(self.seed)
+        vecs = l2_normalize(vecs)
+        nlist = self.nlist or max(1, min(len(vecs) // 16, int(4 * np.sqrt(len(vecs)))))
+        sample = vecs[rng.choice(len(vecs), min(len(vecs), 64 * nlist), replace=False)]
+        cents = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ cents.T, axis=1)
+            sums = np.zeros_like(cents)
+            np.add.at(sums, assign, sample)
+            empty = ~np.bincount(assign, minlength=nlist).astype(bool)
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]  # re-seed dead lists
+            cents = l2_normalize(sums)
+        self.centroids, self.nlist = cents, nlist
+        if self._n:
+            self._assign[:self._n] = self._nearest_list(self._vecs[:self._n])
+            self._packed = None
+
+    def _nearest_list(self, vecs: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        out = np.empty(len(vecs), np.int32)
+        for i in range(0, len(vecs), chunk):
+            out[i:i + chunk] = np.argmax(vecs[i:i + chunk] @ self.centroids.T, axis=1)
+        return out
+
+    # ---------- incremental updates ----------
+    def _grow(self, need: int):
+        cap = len(self._vecs)
+        if need <= cap:
+            return
+        cap = max(need, 2 * cap, 1024)
+        for name in ("_vecs", "_ids", "_assign", "_alive"):
+            old = getattr(self, name)
+            new = np.zeros((cap,) + old.shape[1:], old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def add(self, vecs: np.ndarray, ids: np.ndarray):
+        vecs, ids = l2_normalize(np.atleast_2d(vecs)), np.atleast_1d(np.asarray(ids, np.int64))
+        self.remove([i for i in ids.tolist() if i in self._row_of])
+        start = self._n
+        self._grow(start + len(vecs))
+        end = start + len(vecs)
+        self._vecs[start:end], self._ids[start:end], self._alive[start:end] = vecs, ids, True
+        if self.trained:
+            self._assign[start:end] = self._nearest_list(vecs)
+        self._row_of.update(zip(ids.tolist(), range(start, end)))
+        self._n, self._packed = end, None
+        if not self.trained and len(self) > self.exact_max:
+            self.train(self._vecs[:self._n][self._alive[:self._n]])
+
+    def remove(self, ids):
+        for i in ids:
+            row = self._row_of.pop(int(i), None)
+            if row is not None:
+                self._alive[row] = False
+        self._packed = None
+        if self._n > 1024 and len(self) < self._n // 2:
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._n])
+        for name in ("_vecs", "_ids", "_assign", "_alive"):
+            getattr(self, name)[:len(keep)] = getattr(self, name)[keep]
+        self._n = len(keep)
+        self._row_of = dict(zip(self._ids[:self._n].tolist(), range(self._n)))
+
+    def _by_list(self):
+        """Live vectors and ids sorted by list, plus each list's [start, end) offsets."""
+        if self._packed is None:
+            rows = np.flatnonzero(self._alive[:self._n])
+            order = rows[np.argsort(self._assign[rows], kind="stable")]
+            counts = np.bincount(self._assign[rows], minlength=self.nlist)
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+            self._packed = (np.ascontiguousarray(self._vecs[order]), self._ids[order], offsets)
+        return self._packed
+
+    # ---------- search ----------
+    def search(self, queries: np.ndarray, k: int = 10, nprobe: int | None = None):
+        """(ids, cosine scores) of shape (queries, k); missing slots are id -1."""
+        q = l2_normalize(np.atleast_2d(queries))
+        ids = np.full((len(q), k), -1, np.int64)
+        scores = np.full((len(q), k), -np.inf, np.float32)
+        if not len(self):
+            return ids, scores
+        if not self.trained or len(self) <= self.exact_max:
+            rows = np.flatnonzero(self._alive[:self._n])
+            self._topk(q, rows, k, ids, scores, dense=len(rows) == self._n)
+            return ids, scores
+        vecs, vec_ids, off = self._by_list()
+        nprobe = min(nprobe or self.probes(), self.nlist)
+        probes = np.argpartition(-(q @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        for i, pr in enumerate(probes):
+            sims = np.concatenate([vecs[off[p]:off[p + 1]] @ q[i] for p in pr])
+            if not len(sims):
+                continue
+            rows = np.concatenate([np.arange(off[p], off[p + 1]) for p in pr])
+            kk = min(k, len(sims))
+            part = np.argpartition(-sims, kk - 1)[:kk]
+            part = part[np.argsort(-sims[part])]
+            ids[i, :kk], scores[i, :kk] = vec_ids[rows[part]], sims[part]
+        return ids, scores
+
+    def probes(self) -> int:
+        """Lists scanned per query: nprobe, or probe_frac of the lists if that is more."""
+        return max(self.nprobe, math.ceil(self.probe_frac * (self.nlist or 0)))
+
+    def _topk(self, q, rows, k, ids, scores, dense=False):
+        """Fill `ids`/`scores` in place with the best k of `rows` for each query."""
+        if not len(rows):
+            return
+        # no gather copy when scanning a dense, fully-live buffer
+        vecs = self._vecs[:self._n] if dense else self._vecs[rows]
+        sims = q @ vecs.T
+        kk = min(k, len(rows))
+        part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        top = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-top, axis=1)
+        part, top = np.take_along_axis(part, order, axis=1), np.take_along_axis(top, order, axis=1)
+        ids[:, :kk], scores[:, :kk] = self._ids[rows[part]], top
+
+    # ---------- persistence ----------
+    def save(self, path):
+        live = np.flatnonzero(self._alive[:self._n])
+        np.savez(path, vecs=self._vecs[live], ids=self._ids[live],
+                 centroids=self.centroids if self.trained else np.zeros((0, self.dim), np.float32),
+                 params=np.array([self.nlist or 0, self.nprobe, self.exact_max, self.dim]))
+
+    @classmethod
+    def load(cls, path) -> "IVFIndex":
+        with np.load(path) as z:
+            nlist, nprobe, exact_max, dim = (int(v) for v in z["params"])
+            idx = cls(dim, nlist or None, nprobe, exact_max)
+            if len(z["centroids"]):
+                idx.centroids = z["centroids"]
+            idx.add(z["vecs"], z["ids"])
+        return idx
@@ -0,0 +1,96 @@
+"""Recall@k and latency of the IVF index vs brute-force matmul search.
+
+    python -m bench.ann_bench                   # 1k, 10k, 100k rows
+    python -m bench.ann_bench --sizes 10000 --nprobe 4 8 16 32
+    python -m bench.ann_bench --probe-frac 0.05 --nprobe   # the server's setting (ANN_PROBE_FRAC) only
+
+Synthetic data mimics a face gallery: identities with a few noisy photos
+each (cosine ~0.8 to the identity centre); queries are fresh noisy views
+of random identities.
+"""
+import argparse, json, time
+
+import numpy as np
+
+from ann_index import IVFIndex
+from face_match import l2_normalize
+
+
+def synthetic(n_rows: int, dim: int = 512, per_id: int = 5, noise: float = 0.75, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ids = max(1, n_rows // per_id)
+    centres = l2_normalize(rng.standard_normal((ids, dim)))
+    owner = np.arange(n_rows) % ids
+    rows = l2_normalize(centres[owner] + noise / np.sqrt(dim) * rng.standard_normal((n_rows, dim)))
+    return rows, centres, rng
+
+
+def queries(centres, rng, n: int, noise: float = 0.75):
+    pick = rng.integers(0, len(centres), n)
+    dim = centres.shape[1]
+    return l2_normalize(centres[pick] + noise / np.sqrt(dim) * rng.standard_normal((n, dim)))
+
+
+def timed(fn, qs):
+    out, lat = [], []
+    for q in qs:
+        t = time.perf_counter()
+        out.append(fn(q))
+        lat.append((time.perf_counter() - t) * 1e3)
+    return out, np.array(lat)
+
+
+def pct(lat):
+    return {"p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "p99_ms": round(float(np.percentile(lat, 99)), 3)}
+
+
+def run(size: int, nprobes: list[int], k: int, n_queries: int, probe_fracs: list[float] = ()) -> list[dict]:
+    rows, centres, rng = synthetic(size)
+    qs = queries(centres, rng, n_queries)
+
+    def brute(q):
+        sims = rows @ q
+        part = np.argpartition(-sims, k - 1)[:k]
+        return part[np.argsort(-sims[part])]
+
+    truth, lat = timed(brute, qs)
+    report = [{"size": size, "method": "brute", "recall@k": 1.0, **pct(lat)}]
+
+    t = time.perf_counter()
+    index = IVFIndex(exact_max=0).build(rows)
+    build_s = time.perf_counter() - t
+    # explicit nprobe values, then probe fractions exactly as the server applies them (nprobe=1 floor)
+    settings = [(f"nprobe={n}", n, 0.0) for n in nprobes] + [(f"probe_frac={f}", None, f) for f in probe_fracs]
+    for label, nprobe, frac in settings:
+        index.nprobe, index.probe_frac = 1, frac
+        found, lat = timed(lambda q: index.search(q, k, nprobe=nprobe)[0][0], qs)
+        recall = np.mean([len(set(f.tolist()) & set(t.tolist())) / k for f, t in zip(found, truth)])
+        report.append({"size": size, "method": f"ivf nlist={index.nlist} {label} ({nprobe or index.probes()} lists)",
+                       "recall@k": round(float(recall), 4), "build_s": round(build_s, 2), **pct(lat)})
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--nprobe", type=int, nargs="*", default=[1, 4, 8, 16, 32, 64])
+    ap.add_argument("--probe-frac", type=float, nargs="*", default=[], help="share of lists scanned per query")
+    ap.add_argument("-k", type=int, default=5, help="5 = photos per synthetic identity")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for r in run(size, args.nprobe, args.k, args.queries, args.probe_frac):
+            results.append(r)
+            print(f"{r['size']:>7}  {r['method']:<44} recall@{args.k}={r['recall@k']:.3f}  "
+                  f"p50={r['p50_ms']:.2f}ms  p99={r['p99_ms']:.2f}ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""JPEG decode cost per resolution: full decode vs reduced (DCT-scaled) decode.
+
+    python -m bench.decode_bench                 # ESP32-CAM frame sizes + gallery photos
+    python -m bench.decode_bench --target 320 --json decode.json
+
+Frames are made by resizing a real photo from images/known to each
+ESP32-CAM frame size and re-encoding at quality 85, so the timings reflect
+real image content.
+"""
+import argparse, glob, io, json, time
+
+import numpy as np
+from PIL import Image
+
+from image_ingest import decode_bgr, decode_pil
+
+FRAME_SIZES = {"QVGA": (320, 240), "VGA": (640, 480), "SVGA": (800, 600), "XGA": (1024, 768),
+               "HD": (1280, 720), "SXGA": (1280, 1024), "UXGA": (1600, 1200), "photo 4000x3000": (4000, 3000)}
+
+
+def make_frame(src: Image.Image, size) -> bytes:
+    out = io.BytesIO()
+    src.resize(size).save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+
+def best_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter(); fn(); times.append(time.perf_counter() - t)
+    return float(np.median(times)) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", type=int, default=640, help="long side the consumer needs")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--source", default=None, help="photo to resize (default: largest in images/known)")
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args()
+
+    src_fn = args.source or max(glob.glob("images/known/*/*.jpg"), key=lambda p: Image.open(p).size[0])
+    src = Image.open(src_fn).convert("RGB")
+    results = []
+    print(f"source {src_fn}, target long side {args.target}px (median of {args.repeat})")
+    print(f"{'frame':<16}{'bytes':>9}{'cv2 full':>10}{'cv2 red.':>10}{'PIL full':>10}{'PIL draft':>10}  factor   (ms)")
+    for label, size in FRAME_SIZES.items():
+        buf = make_frame(src, size)
+        row = {"frame": label, "size": size, "bytes": len(buf), "target": args.target,
+               "cv2_full_ms": best_ms(lambda: decode_bgr(buf), args.repeat),
+               "cv2_reduced_ms": best_ms(lambda: decode_bgr(buf, args.target), args.repeat),
+               "pil_full_ms": best_ms(lambda: decode_pil(buf), args.repeat),
+               "pil_draft_ms": best_ms(lambda: decode_pil(buf, args.target), args.repeat),
+               "factor": decode_bgr(buf, args.target)[1]}
+        results.append(row)
+        print(f"{label:<16}{row['bytes']:>9}{row['cv2_full_ms']:>10.2f}{row['cv2_reduced_ms']:>10.2f}"
+              f"{row['pil_full_ms']:>10.2f}{row['pil_draft_ms']:>10.2f}  1/{row['factor']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
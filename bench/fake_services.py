@@ -0,0 +1,150 @@
+"""Rekognition and Telegram Bot API stand-ins over HTTP, for load tests of a real new_server process.
+
+    python -m bench.fake_services --port 9000 --rek-latency 150 --rek-errors 0.02
+    AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=x \\
+    REK_ENDPOINT_URL=http://127.0.0.1:9000 TELEGRAM_BASE_URL=http://127.0.0.1:9000/bot \\
+        uvicorn new_server:app --port 8000
+    python -m bench.load_gen --url http://127.0.0.1:8000 --rate 2 5 10 20
+
+POST / speaks the AWS JSON 1.1 protocol boto3 uses for Rekognition
+(X-Amz-Target: RekognitionService.DetectFaces / SearchFacesByImage /
+IndexFaces) and answers from bench.fakes.FakeRekognition, so latency, error
+rate (ThrottlingException) and the names matched are the same knobs as the
+in-process benchmark. /bot<token>/<method> answers what python-telegram-bot
+calls: getMe, deleteWebhook, long-polled getUpdates (always empty) and the
+send* methods through FakeBot; a failed send comes back as a 429 with
+retry_after, like Telegram's flood control. GET /fake/stats has the counts.
+
+The synthetic frames of bench.stage_bench are registered at start, so
+detect_faces reports their real face boxes; any other image gets one box.
+"""
+import argparse, asyncio, base64, json, time
+from collections import Counter
+
+from botocore.exceptions import ClientError
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from bench.fakes import KNOWN, FakeBot, FakeRekognition
+
+REK_OPS = {"DetectFaces": "detect_faces", "SearchFacesByImage": "search_faces_by_image", "IndexFaces": "index_faces"}
+BOT_USER = {"id": 4242, "is_bot": True, "first_name": "FakeBot", "username": "fake_rubudesk_bot"}
+
+
+def create_app(rek: FakeRekognition, bot: FakeBot, poll_seconds: float = 10.0) -> FastAPI:
+    app = FastAPI()
+    tg_calls = Counter()
+
+    # ---------- Rekognition (AWS JSON 1.1) ----------
+    @app.post("/")
+    async def rekognition(req: Request):
+        op = req.headers.get("x-amz-target", "").rpartition(".")[2]
+        if op not in REK_OPS:
+            return _aws_error(400, "InvalidAction", f"unsupported operation {op!r}")
+        body = json.loads(await req.body() or b"{}")
+        if "Bytes" in body.get("Image", {}):
+            body["Image"]["Bytes"] = base64.b64decode(body["Image"]["Bytes"])
+        try:
+            # FakeRekognition sleeps for its latency: keep that off the event loop
+            return JSONResponse(await asyncio.to_thread(getattr(rek, REK_OPS[op]), **body),
+                                media_type="application/x-amz-json-1.1")
+        except ClientError as e:
+            err = e.response["Error"]
+            return _aws_error(400, err["Code"], err["Message"])
+        except TypeError as e:                        # a parameter the fake doesn't model
+            return _aws_error(400, "InvalidParameterException", str(e))
+
+    # ---------- Telegram Bot API ----------
+    @app.post("/bot{token}/{method}")
+    async def telegram(token: str, method: str, req: Request):
+        tg_calls[method] += 1
+        params = await _tg_params(req)
+        if method == "getMe":
+            return _tg_ok(BOT_USER)
+        if method in ("deleteWebhook", "setMyCommands"):
+            return _tg_ok(True)
+        if method == "getUpdates":
+            await asyncio.sleep(min(float(params.get("timeout") or 0), poll_seconds))
+            return _tg_ok([])
+        chat_id = params.get("chat_id", 0)
+        try:
+            if method == "sendPhoto":
+                await bot.send_photo(chat_id, params.get("photo", b""), params.get("caption"))
+            elif method == "sendMessage":
+                await bot.send_message(chat_id, params.get("text", ""))
+            elif method == "sendMediaGroup":
+                media = json.loads(params.get("media") or "[]")
+                await bot.send_media_group(chat_id, media)
+                bot.bytes_sent += sum(len(v) for v in params.values() if isinstance(v, bytes))
+                return _tg_ok([_message(chat_id) for _ in media])
+            else:
+                return JSONResponse({"ok": False, "error_code": 404, "description": "Not Found"}, 404)
+        except RuntimeError:
+            return JSONResponse({"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                                 "parameters": {"retry_after": 1}}, 429)
+        return _tg_ok(_message(chat_id))
+
+    @app.get("/fake/stats")
+    async def stats():
+        return {"rekognition": {"calls": dict(rek.calls), "errors": dict(rek.errors)},
+                "telegram": {"calls": dict(tg_calls), "sent": dict(bot.sent), "bytes_sent": bot.bytes_sent}}
+
+    return app
+
+
+def _aws_error(status: int, code: str, message: str) -> JSONResponse:
+    return JSONResponse({"__type": code, "message": message}, status, media_type="application/x-amz-json-1.1")
+
+
+def _tg_ok(result) -> JSONResponse:
+    return JSONResponse({"ok": True, "result": result})
+
+
+def _message(chat_id) -> dict:
+    return {"message_id": int(time.time() * 1000) % 2**31, "date": int(time.time()),
+            "chat": {"id": int(chat_id or 0), "type": "private"}}
+
+
+async def _tg_params(req: Request) -> dict:
+    """Bot API parameters from a JSON, urlencoded or multipart body (uploaded files as bytes)."""
+    if req.headers.get("content-type", "").startswith("application/json"):
+        return json.loads(await req.body() or b"{}")
+    params = {}
+    for k, v in (await req.form()).multi_items():
+        params[k] = await v.read() if hasattr(v, "read") else v
+    return params
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9000)
+    ap.add_argument("--rek-latency", type=float, default=150, help="fake Rekognition latency (ms)")
+    ap.add_argument("--rek-jitter", type=float, default=40, help="+/- ms around --rek-latency")
+    ap.add_argument("--rek-errors", type=float, default=0.0, help="share of calls failing with ThrottlingException")
+    ap.add_argument("--match-rate", type=float, default=0.7, help="share of searches that match a known person")
+    ap.add_argument("--names", nargs="+", default=list(KNOWN), help="people searches match")
+    ap.add_argument("--tg-latency", type=float, default=250, help="fake Telegram latency (ms)")
+    ap.add_argument("--tg-errors", type=float, default=0.0, help="share of sends answered with 429")
+    ap.add_argument("--threads", type=int, default=64, help="concurrent Rekognition calls the fake serves")
+    args = ap.parse_args()
+
+    import concurrent.futures, uvicorn
+    from bench.stage_bench import synthetic_frames
+
+    rek = FakeRekognition(args.rek_latency, args.rek_jitter, args.rek_errors, args.match_rate, args.names, seed=None)
+    for f in synthetic_frames():
+        rek.register(f["bytes"], f["boxes"])
+    bot = FakeBot(args.tg_latency, error_rate=args.tg_errors, seed=None)
+    app = create_app(rek, bot)
+
+    @app.on_event("startup")
+    async def _pool():
+        # asyncio.to_thread's default pool (cpu+4 threads) would cap the fake's own concurrency
+        asyncio.get_running_loop().set_default_executor(concurrent.futures.ThreadPoolExecutor(args.threads))
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
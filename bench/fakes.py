@@ -0,0 +1,97 @@
+"""Local stand-ins for AWS Rekognition and the Telegram bot.
+
+They answer the exact calls new_server.py / setup_rek.py make, with
+configurable latency and error rate, so benchmarks and load tests never
+touch AWS or the family chat.
+"""
+import asyncio, hashlib, math, random, time, uuid
+from collections import Counter
+
+from botocore.exceptions import ClientError
+
+KNOWN = ("Amrut", "Rudra", "Rups", "Saswat")
+CENTRE_BOX = {"Left": 0.3, "Top": 0.2, "Width": 0.4, "Height": 0.55}
+
+
+def _digest(buf) -> str:
+    return hashlib.sha1(buf).hexdigest()
+
+
+class FakeRekognition:
+    """Drop-in for the boto3 rekognition client (same method names and kwargs)."""
+
+    def __init__(self, latency_ms: float = 150, jitter_ms: float = 40, error_rate: float = 0.0,
+                 match_rate: float = 0.7, names=KNOWN, seed: int | None = 0):
+        self.latency_ms, self.jitter_ms, self.error_rate = latency_ms, jitter_ms, error_rate
+        self.match_rate, self.names = match_rate, list(names)
+        self.rng = random.Random(seed)
+        self.boxes: dict[str, list[dict]] = {}   # frame sha1 -> BoundingBoxes to report
+        self.calls = Counter()
+        self.errors = Counter()
+
+    def register(self, frame: bytes, boxes: list[dict]):
+        """Make detect_faces report `boxes` (relative Left/Top/Width/Height) for this frame."""
+        self.boxes[_digest(frame)] = boxes
+
+    def _call(self, op: str):
+        self.calls[op] += 1
+        time.sleep(max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+        if self.rng.random() < self.error_rate:
+            self.errors[op] += 1
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, op)
+
+    def detect_faces(self, Image, Attributes=None):
+        self._call("DetectFaces")
+        boxes = self.boxes.get(_digest(Image["Bytes"]), [CENTRE_BOX])
+        return {"FaceDetails": [{"BoundingBox": b, "Confidence": 99.9} for b in boxes]}
+
+    def search_faces_by_image(self, CollectionId, Image, FaceMatchThreshold=80, MaxFaces=1):
+        self._call("SearchFacesByImage")
+        matches = []
+        if self.rng.random() < self.match_rate:
+            name = self.rng.choice(self.names)
+            for _ in range(self.rng.randint(1, MaxFaces)):
+                sim = self.rng.uniform(max(FaceMatchThreshold, 75), 99.9)
+                matches.append({"Similarity": sim, "Face": {"FaceId": str(uuid.uuid4()), "ExternalImageId": name}})
+        matches.sort(key=lambda m: -m["Similarity"])
+        return {"SearchedFaceBoundingBox": CENTRE_BOX, "FaceMatches": matches}
+
+    def index_faces(self, CollectionId, Image, ExternalImageId=None, MaxFaces=1, **kw):
+        self._call("IndexFaces")
+        boxes = self.boxes.get(_digest(Image["Bytes"])) or _grid_boxes(MaxFaces)
+        return {"FaceRecords": [{"Face": {"FaceId": str(uuid.uuid4()), "ExternalImageId": ExternalImageId,
+                                          "BoundingBox": b}} for b in boxes[:MaxFaces]]}
+
+
+def _grid_boxes(n: int) -> list[dict]:
+    """One face centred in each cell of a ceil(sqrt(n))-column grid (the layout of new_server._tile)."""
+    cols = math.ceil(math.sqrt(n)); rows = math.ceil(n / cols)
+    return [{"Left": (i % cols + 0.25) / cols, "Top": (i // cols + 0.25) / rows,
+             "Width": 0.5 / cols, "Height": 0.5 / rows} for i in range(n)]
+
+
+class FakeBot:
+    """Async stand-in for telegram.Bot's send_* methods."""
+
+    def __init__(self, latency_ms: float = 250, jitter_ms: float = 80, error_rate: float = 0.0, seed: int | None = 0):
+        self.latency_ms, self.jitter_ms, self.error_rate = latency_ms, jitter_ms, error_rate
+        self.rng = random.Random(seed)
+        self.sent = Counter()
+        self.bytes_sent = 0
+
+    async def _call(self, method: str):
+        await asyncio.sleep(max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError(f"fake Telegram {method} failed")
+        self.sent[method] += 1
+        return {"message_id": sum(self.sent.values())}
+
+    async def send_photo(self, chat_id, photo, caption=None, **kw):
+        self.bytes_sent += len(photo) if isinstance(photo, (bytes, bytearray)) else 0
+        return await self._call("sendPhoto")
+
+    async def send_message(self, chat_id, text, **kw):
+        return await self._call("sendMessage")
+
+    async def send_media_group(self, chat_id, media, **kw):
+        return await self._call("sendMediaGroup")
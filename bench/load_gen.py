@@ -0,0 +1,145 @@
+"""Open-loop load generator for a running new_server (see bench.fake_services for a setup without AWS).
+
+    python -m bench.load_gen --url http://127.0.0.1:8000 --rate 2 5 10 20 40 --duration 20
+    python -m bench.load_gen --endpoint /recognize-raw --cameras 4 --concurrency 64
+
+Frames are the same set bench.stage_bench uses (photos in images/known and
+images/pending plus synthetic ESP32-CAM frames), or --frames <glob>. At each
+--rate step requests are started on a fixed schedule for --duration seconds,
+regardless of how fast answers come back, with at most --concurrency in
+flight; a request that would exceed that is counted as "shed" instead of
+being queued, so an overloaded server shows up as lost throughput rather
+than as a slow client. Requests cycle through --cameras X-Camera-Id values.
+
+Each step reports achieved throughput, latency p50/p95/p99, the error rate
+(HTTP >= 400, timeouts, connection errors) and sheds. The first step that
+reaches less than 90% of its target rate, or has over 1% errors, is
+reported as the saturation point. Results are written as JSON.
+"""
+import argparse, asyncio, glob, itertools, json, time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from bench.stage_bench import _git_rev, recorded_frames, synthetic_frames
+
+
+def load_frames(pattern: str | None) -> list[bytes]:
+    if pattern:
+        return [Path(p).read_bytes() for p in sorted(glob.glob(pattern))]
+    return [f["bytes"] for f in recorded_frames() + synthetic_frames()]
+
+
+async def step(client: httpx.AsyncClient, path: str, frames: list[bytes], rate: float,
+               duration: float, concurrency: int, cameras: int) -> dict:
+    lat, done, outcomes = [], [], Counter()
+    inflight = set()
+    frame_it, cam_it = itertools.cycle(frames), itertools.cycle(range(cameras))
+
+    async def one(buf: bytes, cam: int):
+        headers = {"X-Camera-Id": f"load{cam}"}
+        t = time.perf_counter()
+        try:
+            if path == "/recognize":
+                r = await client.post(path, files={"image": ("frame.jpg", buf, "image/jpeg")}, headers=headers)
+            else:
+                r = await client.post(path, content=buf, headers={**headers, "Content-Type": "image/jpeg"})
+        except httpx.TimeoutException:
+            outcomes["timeout"] += 1
+            return
+        except httpx.HTTPError as e:
+            outcomes[type(e).__name__] += 1
+            return
+        outcomes["ok" if r.status_code < 400 else f"http_{r.status_code}"] += 1
+        if r.status_code < 400:
+            done.append(time.perf_counter())
+            lat.append((done[-1] - t) * 1000)
+
+    t0 = time.perf_counter()
+    n = int(rate * duration)
+    for i in range(n):
+        delay = t0 + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(inflight) >= concurrency:
+            outcomes["shed"] += 1
+            continue
+        task = asyncio.create_task(one(next(frame_it), next(cam_it)))
+        inflight.add(task)
+        task.add_done_callback(inflight.discard)
+    if inflight:
+        await asyncio.gather(*inflight)
+
+    # completion rate between the first and last answer: the warm-up and the tail of the
+    # last requests don't dilute it, while a growing backlog still stretches it out
+    throughput = (len(done) - 1) / (done[-1] - done[0]) if len(done) > 1 else 0.0
+    errors = sum(v for k, v in outcomes.items() if k not in ("ok", "shed"))
+    a = np.array(lat) if lat else np.zeros(1)
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {"endpoint": path, "target_rps": rate, "sent": n - outcomes["shed"], "ok": outcomes["ok"],
+            "throughput_rps": round(throughput, 2), "error_rate": round(errors / max(n, 1), 4),
+            "shed": outcomes["shed"], "outcomes": dict(outcomes),
+            "latency": {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2),
+                        "p99_ms": round(float(p99), 2), "max_ms": round(float(a.max()), 2)}}
+
+
+def saturated(s: dict) -> bool:
+    return s["throughput_rps"] < 0.9 * s["target_rps"] or s["error_rate"] > 0.01
+
+
+async def run(args) -> dict:
+    frames = load_frames(args.frames)
+    if not frames:
+        raise SystemExit("no frames to send")
+    report = {"url": args.url, "git": _git_rev(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "frames": len(frames), "args": vars(args), "steps": [], "saturation": {}}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        for path in args.endpoint:
+            for rate in args.rate:
+                s = await step(client, path, frames, rate, args.duration, args.concurrency, args.cameras)
+                report["steps"].append(s)
+                _print_step(s)
+                if saturated(s) and path not in report["saturation"]:
+                    report["saturation"][path] = rate
+                    print(f"  ^ saturated at {rate} req/s")
+                    if not args.keep_going:
+                        break
+        try:
+            report["server_stats"] = (await client.get("/stats")).json()
+        except (httpx.HTTPError, ValueError):
+            pass
+    return report
+
+
+def _print_step(s: dict):
+    lat = s["latency"]
+    print(f"{s['endpoint']:<15} target {s['target_rps']:>6} req/s  got {s['throughput_rps']:>7} req/s  "
+          f"p50/p95/p99 {lat['p50_ms']}/{lat['p95_ms']}/{lat['p99_ms']} ms  "
+          f"errors {100 * s['error_rate']:.1f}%  shed {s['shed']}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--endpoint", nargs="+", choices=["/recognize", "/recognize-raw"],
+                    default=["/recognize", "/recognize-raw"])
+    ap.add_argument("--rate", type=float, nargs="+", default=[1, 2, 5, 10, 20], help="req/s steps")
+    ap.add_argument("--duration", type=float, default=20, help="seconds per step")
+    ap.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    ap.add_argument("--cameras", type=int, default=1, help="distinct X-Camera-Id values to cycle through")
+    ap.add_argument("--timeout", type=float, default=30)
+    ap.add_argument("--frames", help="glob of JPEGs to send instead of the benchmark set")
+    ap.add_argument("--keep-going", action="store_true", help="run the remaining steps after saturation")
+    ap.add_argument("--out", help="JSON results file (default load-<time>.json)")
+    args = ap.parse_args()
+    report = asyncio.run(run(args))
+    out = args.out or f"load-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(out).write_text(json.dumps(report, indent=2))
+    print(f"\nsaved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Stage-level benchmark for the recognition servers, fully offline.
+
+    python -m bench.stage_bench --target new_server            # Rekognition/Telegram faked
+    python -m bench.stage_bench --target server --concurrency 1 8
+    python -m bench.stage_bench --compare old.json new.json     # diff two saved runs
+
+Frames: every photo in images/known and images/pending, plus synthetic
+frames at several ESP32-CAM resolutions with 0-4 faces pasted in (faces are
+taken from images/pending). Each endpoint is driven in-process through
+httpx's ASGI transport, first one request at a time and then at each
+--concurrency level. For every phase the report holds end-to-end latency
+and p50/p95/p99 per stage (decode, detect, embed/search, crop, match,
+notify, outbox_delay) as recorded by stage_metrics. Results are written as JSON.
+"""
+import argparse, asyncio, glob, io, json, subprocess, sys, tempfile, time
+from pathlib import Path
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from stage_metrics import stages
+from bench.fakes import FakeBot, FakeRekognition
+from pending_store import PendingStore
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1600, 1200)]
+FACE_COUNTS = [0, 1, 2, 4]
+
+
+# ---------- frames ----------
+def synthetic_frames(faces_dir="images/pending", seed=0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    crops = [Image.open(p).convert("RGB") for p in sorted(glob.glob(f"{faces_dir}/*.jpg"))]
+    frames = []
+    for w, h in RESOLUTIONS:
+        for n in FACE_COUNTS:
+            bg = Image.fromarray(rng.integers(90, 140, (h, w, 3), dtype=np.uint8))
+            boxes = []
+            side = h // 3
+            for i in range(min(n, len(crops))):
+                face = crops[(i + n) % len(crops)].resize((side * 4 // 5, side))
+                x = (i % 4) * (w // 4) + 8
+                y = h // 3 - (i // 4) * side
+                bg.paste(face, (x, y))
+                boxes.append({"Left": x / w, "Top": y / h, "Width": face.size[0] / w, "Height": side / h})
+            out = io.BytesIO(); bg.save(out, "JPEG", quality=85)
+            frames.append({"name": f"synthetic {w}x{h} {n} faces", "bytes": out.getvalue(), "boxes": boxes})
+    return frames
+
+
+def recorded_frames() -> list[dict]:
+    paths = sorted(glob.glob("images/known/*/*")) + sorted(glob.glob("images/pending/*.jpg"))
+    return [{"name": p, "bytes": Path(p).read_bytes(), "boxes": None} for p in paths]
+
+
+# ---------- targets ----------
+async def load_target(name: str, args):
+    if name == "server":
+        import server
+        await server.app.router.startup()
+        return server.app, server.app.router.shutdown, {}
+    import new_server
+    rek = FakeRekognition(args.rek_latency, error_rate=args.rek_errors)
+    bot = FakeBot(args.tg_latency)
+    new_server.rek, new_server.tg_bot = rek, bot
+    new_server.PENDING_DIR = Path(tempfile.mkdtemp(prefix="bench-pending-"))
+    new_server.pending = PendingStore(new_server.PENDING_DIR)
+    new_server.COOLDOWN_SECONDS = 0          # every recognised face notifies
+    new_server.DEBUG_NOTIFY = False
+    if not args.recog_cache:
+        new_server.RECOG_CACHE_TTL = 0       # repeated frames would otherwise all be cache hits
+    if not args.scene_gate:
+        new_server.SCENE_GATE = False        # same for repeated frames of a still scene
+
+    async def _stop():
+        await new_server.outbox.stop()
+    return new_server.app, _stop, {"rek": rek, "bot": bot}
+
+
+async def drain_background():
+    """Wait for background work (queued notifications) so its stage times count."""
+    me = asyncio.current_task()
+    outbox = getattr(sys.modules.get("new_server"), "outbox", None)
+    for _ in range(400):
+        rest = [t for t in asyncio.all_tasks() if t is not me and not t.done() and t.get_name() != "tg-outbox"]
+        if not rest and (outbox is None or outbox.idle()):
+            return
+        await asyncio.sleep(0.05)
+
+
+# ---------- driving ----------
+async def drive(client, path: str, frames: list[dict], concurrency: int, rounds: int) -> dict:
+    work = asyncio.Queue()
+    for _ in range(rounds):
+        for f in frames:
+            work.put_nowait(f)
+    lat, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while not work.empty():
+            f = work.get_nowait()
+            t = time.perf_counter()
+            if path == "/recognize":
+                r = await client.post(path, files={"image": ("frame.jpg", f["bytes"], "image/jpeg")})
+            else:
+                r = await client.post(path, content=f["bytes"], headers={"Content-Type": "image/jpeg"})
+            lat.append((time.perf_counter() - t) * 1000)
+            errors += r.status_code >= 400
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - t0
+    await drain_background()
+    a = np.array(lat)
+    return {"requests": len(a), "errors": errors, "concurrency": concurrency,
+            "throughput_rps": round(len(a) / wall, 2),
+            "e2e": {"p50_ms": round(float(np.percentile(a, 50)), 2), "p95_ms": round(float(np.percentile(a, 95)), 2),
+                    "p99_ms": round(float(np.percentile(a, 99)), 2)},
+            "stages": stages.summary()}
+
+
+async def run(args) -> dict:
+    frames = recorded_frames() + synthetic_frames()
+    app, shutdown, fakes = await load_target(args.target, args)
+    if "rek" in fakes:
+        for f in frames:
+            if f["boxes"] is not None:
+                fakes["rek"].register(f["bytes"], f["boxes"])
+    report = {"target": args.target, "git": _git_rev(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "frames": len(frames), "args": vars(args), "phases": []}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                     timeout=120) as client:
+            for path in ("/recognize", "/recognize-raw"):
+                for conc in [1] + [c for c in args.concurrency if c != 1]:
+                    stages.reset()
+                    phase = {"endpoint": path, **await drive(client, path, frames, conc, args.rounds)}
+                    report["phases"].append(phase)
+                    _print_phase(phase)
+    finally:
+        await shutdown()
+    if fakes:
+        report["fake_calls"] = {"rekognition": dict(fakes["rek"].calls), "telegram": dict(fakes["bot"].sent)}
+    return report
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _print_phase(p: dict):
+    print(f"\n{p['endpoint']}  concurrency={p['concurrency']}  {p['requests']} req  "
+          f"{p['throughput_rps']} req/s  errors={p['errors']}  e2e p50/p95/p99="
+          f"{p['e2e']['p50_ms']}/{p['e2e']['p95_ms']}/{p['e2e']['p99_ms']} ms")
+    for stage, s in p["stages"].items():
+        print(f"  {stage:<12} n={s['n']:<5} p50={s['p50_ms']:>8.2f}  p95={s['p95_ms']:>8.2f}  p99={s['p99_ms']:>8.2f} ms")
+
+
+def compare(old_fn: str, new_fn: str):
+    old, new = json.loads(Path(old_fn).read_text()), json.loads(Path(new_fn).read_text())
+    print(f"{old['git']} -> {new['git']}  (p50 / p99 ms, change in %)")
+    key = lambda p: (p["endpoint"], p["concurrency"])
+    before = {key(p): p for p in old["phases"]}
+    for p in new["phases"]:
+        b = before.get(key(p))
+        if not b:
+            continue
+        print(f"\n{p['endpoint']} concurrency={p['concurrency']}")
+        rows = [("e2e", b["e2e"], p["e2e"])] + [(s, b["stages"][s], v) for s, v in p["stages"].items() if s in b["stages"]]
+        for stage, x, y in rows:
+            d50 = 100 * (y["p50_ms"] - x["p50_ms"]) / max(x["p50_ms"], 1e-9)
+            d99 = 100 * (y["p99_ms"] - x["p99_ms"]) / max(x["p99_ms"], 1e-9)
+            print(f"  {stage:<12} {x['p50_ms']:>8.2f} -> {y['p50_ms']:>8.2f} ({d50:+.0f}%)   "
+                  f"{x['p99_ms']:>8.2f} -> {y['p99_ms']:>8.2f} ({d99:+.0f}%)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", choices=["server", "new_server"], default="new_server")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[8])
+    ap.add_argument("--rounds", type=int, default=1, help="passes over the frame set per phase")
+    ap.add_argument("--rek-latency", type=float, default=150, help="fake Rekognition latency (ms)")
+    ap.add_argument("--rek-errors", type=float, default=0.0, help="fake Rekognition error rate")
+    ap.add_argument("--tg-latency", type=float, default=250, help="fake Telegram latency (ms)")
+    ap.add_argument("--recog-cache", action="store_true", help="keep new_server's recognition cache on")
+    ap.add_argument("--scene-gate", action="store_true", help="keep new_server's scene-change gate on")
+    ap.add_argument("--out", help="JSON results file (default bench-<target>-<time>.json)")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two saved result files")
+    args = ap.parse_args()
+    if args.compare:
+        return compare(*args.compare)
+    report = asyncio.run(run(args))
+    out = args.out or f"bench-{args.target}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(out).write_text(json.dumps(report, indent=2))
+    print(f"\nsaved {out}")
+
+
+if __name__ == "__main__":
+    main()
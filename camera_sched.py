@@ -0,0 +1,102 @@
+"""Per-camera state for new_server: fair sharing of the Rekognition budget and
+bounded, expiring notify cooldowns.
+
+    fair = FairLimiter(8, weights={"front": 2})
+    async with fair.slot("side"):       # at most 8 holders overall
+        ...
+
+While there are free slots every caller gets one at once. Once the budget is
+exhausted, freed slots go round-robin over the cameras that are waiting (a
+camera with weight w gets up to w slots per turn), so a busy camera queues
+behind its own backlog instead of everyone else's.
+"""
+import asyncio, time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+
+
+class FairLimiter:
+    def __init__(self, capacity: int, weights: dict[str, int] | None = None):
+        self.capacity, self.weights = capacity, weights or {}
+        self.active = 0
+        self._queues: OrderedDict[str, deque] = OrderedDict()   # rotation order of waiting keys
+        self._credit: dict[str, int] = {}
+        self.granted, self.waited = Counter(), Counter()
+
+    async def acquire(self, key: str):
+        if self.active < self.capacity and not self._queues:
+            self.active += 1
+            self.granted[key] += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append((key, fut))
+        self.waited[key] += 1
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():   # granted, then cancelled before running
+                self.release()
+            raise
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.active < self.capacity and self._queues:
+            key, q = next(iter(self._queues.items()))
+            _, fut = q.popleft()
+            credit = self._credit.get(key, self.weights.get(key, 1)) - 1
+            if not q:
+                del self._queues[key]
+                self._credit.pop(key, None)
+            elif credit <= 0:
+                self._queues.move_to_end(key)       # turn over: next camera
+                self._credit.pop(key, None)
+            else:
+                self._credit[key] = credit
+            if fut.cancelled():
+                continue
+            fut.set_result(None)
+            self.active += 1
+            self.granted[key] += 1
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {"capacity": self.capacity, "active": self.active,
+                "waiting": {k: len(q) for k, q in self._queues.items()},
+                "granted": dict(self.granted), "waited": dict(self.waited)}
+
+
+class Cooldown:
+    """Last-notified time per key (e.g. (camera, name)); entries expire and are LRU-capped."""
+
+    def __init__(self, max_keys: int = 4096):
+        self.max_keys = max_keys
+        self._last: OrderedDict = OrderedDict()     # oldest mark first
+
+    def allow(self, key, seconds: float, now: float | None = None) -> bool:
+        """True (and the key is marked) if `key` was not marked in the last `seconds`."""
+        now = time.time() if now is None else now
+        while self._last:
+            k, t = next(iter(self._last.items()))
+            if now - t < seconds:
+                break
+            del self._last[k]                        # expired: no longer blocks anything
+        if key in self._last:
+            return False
+        self._last[key] = now
+        while len(self._last) > self.max_keys:
+            self._last.popitem(last=False)
+        return True
+
+    def __len__(self):
+        return len(self._last)
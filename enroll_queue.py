@@ -0,0 +1,103 @@
+"""Background queue for Telegram /label jobs.
+
+    enroll = EnrollQueue(process, workers=2)
+    await enroll.submit(EnrollJob("Amrut", ["1a2b3c4d"], replies=[...]))   # returns at once
+
+`workers` tasks take jobs one at a time, so at most that many enrollments
+hold Rekognition connections while /recognize keeps the rest. Jobs for the
+same person still waiting in the queue are merged into the one being
+started, so a backlog of labels for one person goes through in one pass
+and every chat that asked gets the answer.
+`process(job)` removes tokens from `job.tokens` as they are indexed; if it
+raises, the job is retried with what is left after an exponential backoff.
+"""
+import asyncio
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+
+@dataclass
+class EnrollJob:
+    person: str
+    tokens: list[str]
+    replies: list = field(default_factory=list)     # async callable(text) per /label folded in
+    indexed: int = 0                # faces indexed so far (kept across retries)
+    missing: list[str] = field(default_factory=list)
+    unmatched: list[str] = field(default_factory=list)   # crops Rekognition found no face in
+    merged: int = 1                 # /label commands folded into this job
+
+
+class EnrollQueue:
+    def __init__(self, process, workers: int = 2, retries: int = 3, backoff: float = 2.0, maxsize: int = 200):
+        self.process, self.workers = process, workers
+        self.retries, self.backoff, self.maxsize = retries, backoff, maxsize
+        self._q: deque[EnrollJob] = deque()
+        self._ready = asyncio.Condition()
+        self._tasks: list[asyncio.Task] = []
+        self._busy = 0
+        self.counts = Counter()     # submitted / merged / done / retries / failed
+
+    async def submit(self, job: EnrollJob) -> int:
+        """Queue a job and return how many jobs are ahead of it."""
+        if len(self._q) >= self.maxsize:
+            raise asyncio.QueueFull
+        self.start()
+        async with self._ready:
+            self._q.append(job)
+            self.counts["submitted"] += 1
+            self._ready.notify()
+        return len(self._q) - 1 + self._busy
+
+    def start(self):
+        self._tasks = [t for t in self._tasks if not t.done()]
+        for i in range(len(self._tasks), self.workers):
+            self._tasks.append(asyncio.get_running_loop().create_task(self._run(), name=f"enroll-{i}"))
+
+    def stop(self):
+        for t in self._tasks:
+            t.cancel()
+
+    async def _next(self) -> EnrollJob:
+        async with self._ready:
+            await self._ready.wait_for(lambda: self._q)
+            job = self._q.popleft()
+            for other in [j for j in self._q if j.person.casefold() == job.person.casefold()]:
+                self._q.remove(other)
+                job.tokens += [t for t in other.tokens if t not in job.tokens]
+                job.replies += other.replies
+                job.merged += other.merged
+                self.counts["merged"] += 1
+            return job
+
+    async def _run(self):
+        while True:
+            job = await self._next()
+            self._busy += 1
+            try:
+                await self._attempt(job)
+            finally:
+                self._busy -= 1
+
+    async def _attempt(self, job: EnrollJob):
+        for attempt in range(self.retries + 1):
+            try:
+                msg = await self.process(job)
+            except Exception as e:
+                if attempt == self.retries:
+                    self.counts["failed"] += 1
+                    msg = (f"Could not save *{job.person}*: {e}. "
+                           f"{len(job.tokens)} crop(s) kept, try /label again later.")
+                    break
+                self.counts["retries"] += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+            else:
+                self.counts["done"] += 1
+                break
+        for reply in job.replies:
+            try:
+                await reply(msg)
+            except Exception as e:
+                print("[enroll] reply failed:", e)
+
+    def stats(self) -> dict:
+        return {"queued": len(self._q), "in_progress": self._busy, **self.counts}
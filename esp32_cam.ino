@@ -16,6 +16,7 @@ const char* WIFI_PASS = "success@2020";
 const char* SERVER_HOST = "192.168.29.42";   // <-- CHANGE THIS (PC LAN IP)
 const uint16_t SERVER_PORT = 8000;
 const char* SERVER_PATH = "/recognize";
+const char* CAMERA_ID   = "front";          // per-camera cooldowns and fair AWS share on the server
 
 // ---------- Camera pins: AI-Thinker ----------
 #define PWDN_GPIO_NUM     32
@@ -80,6 +81,7 @@ bool postMultipartJpeg(const uint8_t* data, size_t len, String& bodyOut, int& co
   // Request line + headers
   client.printf("POST %s HTTP/1.1\r\n", SERVER_PATH);
   client.printf("Host: %s:%u\r\n", SERVER_HOST, SERVER_PORT);
+  client.printf("X-Camera-Id: %s\r\n", CAMERA_ID);
   client.printf("Content-Type: multipart/form-data; boundary=%s\r\n", boundary.c_str());
   client.printf("Content-Length: %u\r\n", (unsigned)contentLen);
   client.print("Connection: close\r\n\r\n");
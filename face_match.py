@@ -0,0 +1,81 @@
+"""Vectorised gallery matching for the local insightface server.
+
+The gallery is one contiguous, L2-normalised float32 matrix with several
+prototype rows per identity (one per enrolled photo plus the centroid).
+Rows are grouped by identity so per-identity scores are a single
+`np.maximum.reduceat` over the similarity matrix. Large galleries can attach
+an ANN index over the rows (see ann_index.IVFIndex) to avoid the full scan.
+"""
+import numpy as np
+
+
+def l2_normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, np.float32)
+    n = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(n, 1e-12)
+
+
+def cos_to_dist(score):
+    """Euclidean distance between unit vectors with cosine `score`."""
+    return np.sqrt(np.maximum(0.0, 2.0 - 2.0 * np.asarray(score)))
+
+
+class Gallery:
+    def __init__(self, protos: dict[str, np.ndarray], with_centroid: bool = True, index=None):
+        names, blocks = [], []
+        for name in sorted(protos):
+            embs = l2_normalize(np.atleast_2d(protos[name]))
+            if not len(embs):
+                continue
+            if with_centroid and len(embs) > 1:
+                embs = np.vstack([embs, l2_normalize(embs.mean(axis=0))])
+            names.append(name); blocks.append(embs)
+        self.names = names
+        sizes = np.array([len(b) for b in blocks], np.int64)
+        self.starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        self.labels = np.repeat(np.arange(len(names)), sizes)
+        self.matrix = np.ascontiguousarray(np.vstack(blocks) if blocks else np.zeros((0, 512)), np.float32)
+        self.index = index          # optional ANN index over matrix rows (ids = row numbers)
+
+    def __len__(self):
+        return len(self.names)
+
+    def scores(self, embs: np.ndarray) -> np.ndarray:
+        """(faces, identities) best cosine score per identity, one matmul."""
+        q = l2_normalize(np.atleast_2d(embs))
+        if not len(self.names):
+            return np.zeros((len(q), 0), np.float32)
+        sims = q @ self.matrix.T
+        return np.maximum.reduceat(sims, self.starts, axis=1)
+
+    def search(self, embs: np.ndarray, k: int = 3) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k identities per face: (indices, cosine scores), best first; -1 pads."""
+        if self.index is not None:
+            return self._search_index(embs, k)
+        per_id = self.scores(embs)
+        k = min(k, per_id.shape[1])
+        if k == 0:
+            empty = np.zeros((per_id.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        idx = np.argpartition(-per_id, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(per_id, idx, axis=1)
+        order = np.argsort(-top, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+    def _search_index(self, embs: np.ndarray, k: int, fanout: int = 8):
+        """ANN over prototype rows, collapsed to the best row per identity."""
+        rows, sims = self.index.search(l2_normalize(np.atleast_2d(embs)), k * fanout)
+        idx = np.full((len(rows), k), -1, np.int64)
+        top = np.full((len(rows), k), -np.inf, np.float32)
+        for f, (r, s) in enumerate(zip(rows, sims)):
+            ok = r >= 0
+            labels = self.labels[r[ok]]
+            _, first = np.unique(labels, return_index=True)   # rows arrive best-first
+            best = first[np.argsort(first)][:k]
+            idx[f, :len(best)], top[f, :len(best)] = labels[best], s[ok][best]
+        return idx, top
+
+    def match(self, embs: np.ndarray, k: int = 3) -> list[list[tuple[str, float]]]:
+        """Ranked (name, cosine) candidates for every face."""
+        idx, top = self.search(embs, k)
+        return [[(self.names[i], float(s)) for i, s in zip(ri, rs) if i >= 0] for ri, rs in zip(idx, top)]
@@ -0,0 +1,100 @@
+"""Detection / embedding steps of insightface's FaceAnalysis.get, split apart.
+
+`fa.get(img)` detects and then runs every loaded model one face at a time.
+Splitting it lets callers detect several frames and embed all of their
+faces with a single batched call into the recognition model.
+
+Only the detection and recognition models are loaded (landmark and
+gender/age heads are never used). Detection is two-stage: a cheap pass at
+`fast_size` answers the common "nobody there" frame on its own, and the
+full `det_size` pass only runs when the faces found are too small to trust.
+"""
+import numpy as np
+import onnxruntime as ort
+from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
+
+from stage_metrics import stages
+
+
+MODULES = ["detection", "recognition"]
+
+
+def load_model(det_size=(640, 640), intra_op_threads: int | None = None,
+               modules: list[str] = MODULES) -> FaceAnalysis:
+    """buffalo_l on CPU, optionally pinned to `intra_op_threads` per ONNX session."""
+    fa = FaceAnalysis(name="buffalo_l", providers=["CPUExecutionProvider"], allowed_modules=modules)
+    fa.prepare(ctx_id=0, det_size=det_size)
+    if intra_op_threads:
+        # FaceAnalysis doesn't forward SessionOptions, so rebuild the sessions
+        so = ort.SessionOptions()
+        so.intra_op_num_threads, so.inter_op_num_threads = intra_op_threads, 1
+        for m in fa.models.values():
+            m.session = ort.InferenceSession(m.model_file, sess_options=so,   # sessions don't expose their path
+                                             providers=["CPUExecutionProvider"])
+    return fa
+
+
+def _detect_at(fa, img, size, max_num):
+    bboxes, kpss = fa.det_model.detect(img, input_size=size, max_num=max_num, metric="default")
+    return [Face(bbox=b[:4], kps=None if kpss is None else kpss[i], det_score=b[4])
+            for i, b in enumerate(bboxes)]
+
+
+def detect(fa, img: np.ndarray, max_num: int = 0, fast_size: int | None = 320,
+           small_face_px: int = 20) -> list[Face]:
+    """Faces in `img`, trying a low-resolution pass first.
+
+    No face at `fast_size` -> return [] straight away. If the smallest face
+    found would be under `small_face_px` pixels at that size, detection is
+    redone at the model's full det_size (set by fa.prepare). fast_size=None
+    always runs the full pass.
+    """
+    full = fa.det_model.input_size
+    if not fast_size or fast_size >= max(full):
+        return _detect_at(fa, img, full, max_num)
+    faces = _detect_at(fa, img, (fast_size, fast_size), max_num)
+    if not faces:
+        return []
+    scale = fast_size / max(img.shape[:2])
+    smallest = min(min(f.bbox[2] - f.bbox[0], f.bbox[3] - f.bbox[1]) for f in faces) * scale
+    if smallest < small_face_px:
+        return _detect_at(fa, img, full, max_num)
+    return faces
+
+
+def embed(fa, pairs: list[tuple[np.ndarray, Face]]):
+    """Fill `face.embedding` for every (image, face) pair with one model call."""
+    if not pairs:
+        return
+    rec = fa.models["recognition"]
+    crops = [face_align.norm_crop(img, landmark=f.kps, image_size=rec.input_size[0]) for img, f in pairs]
+    feats = rec.get_feat(crops)
+    for (_, f), feat in zip(pairs, feats):
+        f.embedding = feat.flatten()
+
+
+def run_jobs(fa, jobs: list[tuple], **detect_kw) -> list[list[Face]]:
+    """Batch entry point for the scheduler and the worker pool.
+
+    Each job is one of
+      ("analyze", img)        -> faces with embeddings
+      ("detect", img)         -> faces without embeddings
+      ("embed", img, faces)   -> the given faces with embeddings
+    Every face needing an embedding across the batch goes in one model call.
+    """
+    out, pairs = [], []
+    for kind, img, *rest in jobs:
+        if kind == "embed":
+            faces = rest[0]
+        else:
+            with stages.time("detect"):
+                faces = detect(fa, img, **detect_kw)
+        if kind != "detect":
+            pairs += [(img, f) for f in faces]
+        out.append(faces)
+    if pairs:
+        with stages.time("embed"):
+            embed(fa, pairs)
+    return out
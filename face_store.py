@@ -0,0 +1,159 @@
+"""Persistent per-photo embedding store for the images/known gallery.
+
+Layout of the cache dir:
+  manifest.json   {"model", "dim", "matrix", "entries": {relpath: {...}}}
+  emb-<id>.npy    float32 (rows, dim) matrix, loaded memory-mapped
+
+Entries are keyed by path relative to the gallery root and carry the file's
+sha1, its stat signature and its row in the matrix (-1 = no face found).
+A new matrix file is written before the manifest that points at it, so a
+crash mid-sync leaves the previous snapshot intact. An old matrix that can't
+be deleted yet (still mapped, on Windows) is removed by the next _load.
+"""
+import hashlib, json, os
+from pathlib import Path
+from typing import Callable
+from uuid import uuid4
+
+import numpy as np
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def sha1_file(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class EmbeddingStore:
+    def __init__(self, root: str = "images/known", cache_dir: str = "images/.embcache",
+                 model: str = "buffalo_l", dim: int = 512):
+        self.root = Path(root)
+        self.cache_dir = Path(cache_dir)
+        self.model, self.dim = model, dim
+        self.entries: dict[str, dict] = {}
+        self.matrix = np.zeros((0, dim), np.float32)
+        self._matrix_fn: str | None = None
+        self._load()
+
+    @property
+    def snapshot(self) -> str | None:
+        """Name of the current matrix file; changes whenever the matrix is rewritten."""
+        return self._matrix_fn
+
+    # ---------- persistence ----------
+    def _load(self):
+        mf = self.cache_dir / "manifest.json"
+        if not mf.exists():
+            return
+        try:
+            meta = json.loads(mf.read_text())
+            if meta.get("model") != self.model or meta.get("dim") != self.dim:
+                print(f"[store] model changed ({meta.get('model')} -> {self.model}); rebuilding")
+                return
+            matrix = np.load(self.cache_dir / meta["matrix"], mmap_mode="r") if meta["matrix"] else self.matrix
+        except (OSError, ValueError, KeyError) as e:
+            print("[store] cache unreadable, rebuilding:", e)
+            return
+        self.entries, self.matrix, self._matrix_fn = meta["entries"], matrix, meta["matrix"]
+        for fn in self.cache_dir.glob("emb-*.npy"):
+            if fn.name != self._matrix_fn:
+                self._remove(fn)
+
+    @staticmethod
+    def _remove(fn: Path):
+        try:
+            fn.unlink(missing_ok=True)
+        except OSError as e:        # Windows won't delete a file something still has mapped
+            print(f"[store] could not remove {fn.name} yet:", e)
+
+    def _write_manifest(self, entries: dict[str, dict], matrix_fn: str | None):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        meta = {"model": self.model, "dim": self.dim, "matrix": matrix_fn, "entries": entries}
+        _write_atomic(self.cache_dir / "manifest.json", json.dumps(meta).encode())
+        self.entries, self._matrix_fn = entries, matrix_fn
+
+    def _save(self, matrix: np.ndarray, entries: dict[str, dict]):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        old_fn = self._matrix_fn
+        new_fn = None
+        if len(matrix):
+            new_fn = f"emb-{uuid4().hex[:8]}.npy"
+            np.save(self.cache_dir / new_fn, np.ascontiguousarray(matrix, np.float32))
+        self._write_manifest(entries, new_fn)
+        self.matrix = np.load(self.cache_dir / new_fn, mmap_mode="r") if new_fn else matrix
+        if old_fn and old_fn != new_fn:
+            self._remove(self.cache_dir / old_fn)
+
+    # ---------- sync ----------
+    def scan(self) -> dict[str, Path]:
+        """relpath -> path for every image under <root>/<person>/."""
+        files = {}
+        if not self.root.is_dir():
+            return files
+        for p in sorted(self.root.glob("*/*")):
+            if p.is_file() and p.suffix.lower() in IMAGE_EXTS:
+                files[p.relative_to(self.root).as_posix()] = p
+        return files
+
+    def sync(self, embed: Callable[[Path], np.ndarray | None]) -> dict:
+        """Bring the cache in line with the gallery dir.
+
+        `embed(path)` is only called for new or modified photos; entries for
+        deleted photos are dropped. Returns counts of what changed.
+        """
+        files = self.scan()
+        kept, fresh, stats = {}, [], {"kept": 0, "embedded": 0, "dropped": 0}
+        for rel, path in files.items():
+            st = path.stat()
+            sig = [st.st_size, st.st_mtime_ns]
+            old = self.entries.get(rel)
+            if old and old["sig"] == sig:
+                kept[rel] = old; continue
+            digest = sha1_file(path)
+            if old and old["sha1"] == digest:
+                kept[rel] = {**old, "sig": sig}; continue
+            vec = embed(path)
+            fresh.append((rel, {"sha1": digest, "sig": sig, "person": rel.split("/", 1)[0]}, vec))
+        stats["kept"] = len(kept)
+        stats["embedded"] = len(fresh)
+        stats["dropped"] = len(set(self.entries) - set(kept))
+
+        if not fresh and not stats["dropped"]:
+            if kept != self.entries:    # only stat signatures moved; matrix is unchanged
+                self._write_manifest(kept, self._matrix_fn)
+            return stats
+
+        rows, entries = [], {}
+        for rel, e in kept.items():
+            if e["row"] >= 0:
+                rows.append(np.array(self.matrix[e["row"]]))     # a copy, not a view into the old mmap
+                e = {**e, "row": len(rows) - 1}
+            entries[rel] = e
+        for rel, e, vec in fresh:
+            if vec is not None:
+                rows.append(np.asarray(vec, np.float32).reshape(self.dim))
+                e["row"] = len(rows) - 1
+            else:
+                e["row"] = -1
+            entries[rel] = e
+        matrix = np.stack(rows).astype(np.float32) if rows else np.zeros((0, self.dim), np.float32)
+        self._save(matrix, entries)
+        return stats
+
+    def by_person(self) -> dict[str, np.ndarray]:
+        """person -> (n_photos, dim) embeddings, one row per photo with a face."""
+        rows: dict[str, list[int]] = {}
+        for e in self.entries.values():
+            if e["row"] >= 0:
+                rows.setdefault(e["person"], []).append(e["row"])
+        return {p: np.asarray(self.matrix[idx]) for p, idx in sorted(rows.items())}
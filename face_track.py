@@ -0,0 +1,76 @@
+"""Cross-frame face tracking for streamed video.
+
+Detections are associated with existing tracks greedily by IoU against each
+track's motion-predicted box (constant velocity). A track only needs a new
+embedding when it is born or every `confirm_every` frames after its last
+one; in between it keeps the identity it already has.
+"""
+import itertools
+
+import numpy as np
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(len(a), len(b)) IoU between x1,y1,x2,y2 boxes."""
+    a, b = np.asarray(a, np.float32).reshape(-1, 4), np.asarray(b, np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0]); y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2]); y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class Track:
+    def __init__(self, tid: int, bbox: np.ndarray, frame: int):
+        self.id = tid
+        self.bbox = np.asarray(bbox, np.float32)
+        self.velocity = np.zeros(4, np.float32)
+        self.last_seen = frame
+        self.last_embed = -1
+        self.identity: dict = {"name": "unknown"}   # last match result for this track
+
+    def predicted(self, frame: int) -> np.ndarray:
+        return self.bbox + self.velocity * (frame - self.last_seen)
+
+    def observe(self, bbox: np.ndarray, frame: int):
+        bbox = np.asarray(bbox, np.float32)
+        step = (bbox - self.bbox) / max(1, frame - self.last_seen)
+        self.velocity = 0.5 * self.velocity + 0.5 * step
+        self.bbox, self.last_seen = bbox, frame
+
+
+class FaceTracker:
+    def __init__(self, iou_min: float = 0.3, confirm_every: int = 15, max_missed: int = 10):
+        self.iou_min, self.confirm_every, self.max_missed = iou_min, confirm_every, max_missed
+        self.tracks: list[Track] = []
+        self.frame = 0
+        self._ids = itertools.count(1)
+
+    def update(self, boxes: np.ndarray) -> list[tuple[Track, bool]]:
+        """Advance one frame; per detection (in order) its track and whether to embed it."""
+        self.frame += 1
+        boxes = np.asarray(boxes, np.float32).reshape(-1, 4)
+        owner = [None] * len(boxes)
+        if self.tracks and len(boxes):
+            iou = iou_matrix(boxes, np.stack([t.predicted(self.frame) for t in self.tracks]))
+            while True:
+                d, t = np.unravel_index(np.argmax(iou), iou.shape)
+                if iou[d, t] < self.iou_min:
+                    break
+                owner[d] = self.tracks[t]
+                iou[d, :], iou[:, t] = -1, -1
+        out = []
+        for box, track in zip(boxes, owner):
+            if track is None:
+                track = Track(next(self._ids), box, self.frame)
+                self.tracks.append(track)
+            else:
+                track.observe(box, self.frame)
+            due = track.last_embed < 0 or self.frame - track.last_embed >= self.confirm_every
+            out.append((track, due))
+        self.tracks = [t for t in self.tracks if self.frame - t.last_seen <= self.max_missed]
+        return out
+
+    def identified(self, track: Track, identity: dict):
+        track.identity, track.last_embed = identity, self.frame
@@ -0,0 +1,103 @@
+"""Shared JPEG ingest: decode once, at the smallest scale the consumer needs.
+
+libjpeg can decode at 1/2, 1/4 or 1/8 scale straight from the DCT
+coefficients, which is much cheaper than a full decode followed by a
+resize. cv2 exposes it as IMREAD_REDUCED_COLOR_*, PIL as Image.draft().
+The size is read from the JPEG header first so the largest reduction that
+still covers `target` pixels on the long side can be chosen.
+
+Request bodies are wrapped with np.frombuffer / memoryview, never copied.
+"""
+import io, struct
+
+import numpy as np
+
+_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(buf) -> tuple[int, int] | None:
+    """(width, height) from the JPEG SOF header, or None if not a JPEG."""
+    mv = memoryview(buf)
+    if len(mv) < 4 or mv[0] != 0xFF or mv[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < len(mv):
+        if mv[i] != 0xFF:
+            return None
+        marker = mv[i + 1]
+        if marker == 0xFF:           # fill byte
+            i += 1; continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2; continue
+        seg_len = struct.unpack(">H", mv[i + 2:i + 4])[0]
+        if marker in _SOF:
+            h, w = struct.unpack(">HH", mv[i + 5:i + 9])
+            return w, h
+        i += 2 + seg_len
+    return None
+
+
+def reduction(size: tuple[int, int] | None, target: int | None) -> int:
+    """Largest of 8/4/2/1 that keeps the long side >= target."""
+    if not size or not target:
+        return 1
+    long_side = max(size)
+    for factor in (8, 4, 2):
+        if long_side / factor >= target:
+            return factor
+    return 1
+
+
+def decode_bgr(buf, target: int | None = None) -> tuple[np.ndarray | None, int]:
+    """cv2 BGR decode of `buf`, reduced for `target`; returns (image, factor)."""
+    import cv2
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+    factor = reduction(jpeg_size(buf), target)
+    img = cv2.imdecode(np.frombuffer(buf, np.uint8), flags[factor])
+    return img, factor
+
+
+def decode_gray(buf, target: int | None = None) -> tuple[np.ndarray | None, int]:
+    """cv2 grayscale decode of `buf`, reduced for `target`; returns (image, factor)."""
+    import cv2
+    flags = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+             4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+    factor = reduction(jpeg_size(buf), target)
+    img = cv2.imdecode(np.frombuffer(buf, np.uint8), flags[factor])
+    return img, factor
+
+
+def decode_pil(buf, target: int | None = None):
+    """PIL RGB decode of `buf`, reduced with draft mode; returns (image, factor)."""
+    from PIL import Image
+    im = Image.open(io.BytesIO(buf))
+    factor = 1
+    if target and im.format == "JPEG":
+        w, h = im.size
+        s = target / max(w, h)
+        if s < 1:
+            im.draft("RGB", (int(w * s + 0.5), int(h * s + 0.5)))   # result still covers target
+            factor = max(1, round(w / im.size[0]))
+    return im.convert("RGB"), factor
+
+
+class Frame:
+    """One uploaded image, decoded at most once per representation."""
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.size = jpeg_size(buf)
+        self._bgr: dict[int | None, tuple] = {}
+        self._pil = None
+
+    def bgr(self, target: int | None = None) -> tuple[np.ndarray | None, int]:
+        if target not in self._bgr:
+            self._bgr[target] = decode_bgr(self.buf, target)
+        return self._bgr[target]
+
+    def pil(self):
+        """Full-resolution RGB PIL image (crops need every pixel)."""
+        if self._pil is None:
+            self._pil, _ = decode_pil(self.buf)
+        return self._pil
@@ -0,0 +1,90 @@
+"""Micro-batching scheduler that keeps model inference off the event loop.
+
+Requests are queued; a single collector task takes the first waiting frame,
+keeps collecting for up to `window_ms` (or until `max_batch` frames), then
+runs the whole batch on a dedicated one-thread executor. Each caller's
+future is resolved with its own slice of the results.
+"""
+import asyncio, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+
+class InferenceScheduler:
+    def __init__(self, run_batch: Callable[[list], list], window_ms: float = 10,
+                 max_batch: int = 8, name: str = "infer"):
+        self.run_batch = run_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._running = 0                    # frames in the batch currently on the executor
+        self._batches = Counter()            # batch size -> count
+        self._wait_ms = self._run_ms = 0.0   # totals, for averages
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, item):
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, fut, time.monotonic()))
+        return await fut
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._run(batch)
+
+    async def _run(self, batch):
+        t0 = time.monotonic()
+        self._running = len(batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.run_batch, [item for item, _, _ in batch])
+        except Exception as e:
+            for _, fut, _ in batch:
+                if not fut.done(): fut.set_exception(e)
+        else:
+            for (_, fut, _), res in zip(batch, results):
+                if not fut.done(): fut.set_result(res)
+        finally:
+            self._running = 0
+        t1 = time.monotonic()
+        self._batches[len(batch)] += 1
+        self._wait_ms += sum(t0 - queued for _, _, queued in batch) * 1000
+        self._run_ms += (t1 - t0) * 1000
+
+    def stats(self) -> dict:
+        n_batches = sum(self._batches.values())
+        n_frames = sum(size * n for size, n in self._batches.items())
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "in_flight": self._running,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": n_batches,
+            "frames": n_frames,
+            "avg_batch": round(n_frames / n_batches, 2) if n_batches else 0,
+            "batch_sizes": dict(sorted(self._batches.items())),
+            "avg_queue_wait_ms": round(self._wait_ms / n_frames, 2) if n_frames else 0,
+            "avg_batch_run_ms": round(self._run_ms / n_batches, 2) if n_batches else 0,
+        }
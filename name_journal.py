@@ -0,0 +1,126 @@
+"""FaceId -> name map persisted as a snapshot plus an append-only journal.
+
+    names = NameJournal("face_map.json")     # journal: face_map.jsonl
+    names.update({face_id: "Amrut"}); names.flush()
+    names.get(face_id, "unknown")
+
+Changes are buffered and appended to the journal as one write + fsync per
+flush (automatically every `batch` changes), so labelling costs O(changes)
+instead of rewriting the whole map. Once the journal holds `compact_after`
+records it is folded into the snapshot, which is replaced atomically; a
+crash at any point leaves snapshot + journal replaying to the same map.
+Both files are read on first access, not at import.
+"""
+import json, os, threading
+from pathlib import Path
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class NameJournal:
+    def __init__(self, snapshot: str | Path = "face_map.json", batch: int = 64, compact_after: int = 1000):
+        self.snapshot = Path(snapshot)
+        self.journal = self.snapshot.with_suffix(".jsonl")
+        self.batch, self.compact_after = batch, compact_after
+        self._map: dict[str, str] | None = None
+        self._buf: list[dict] = []
+        self._records = 0               # records in the journal file
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> dict[str, str]:
+        if self._map is None:
+            with self._lock:
+                if self._map is None:
+                    self._map = self._load()
+        return self._map
+
+    def _load(self) -> dict[str, str]:
+        m = json.loads(self.snapshot.read_text()) if self.snapshot.exists() else {}
+        if self.journal.exists():
+            raw = self.journal.read_bytes()
+            if raw and not raw.endswith(b"\n"):
+                # torn last record from a crash mid-append: cut it so the next append starts clean
+                raw = raw[:raw.rfind(b"\n") + 1]
+                with open(self.journal, "r+b") as f:
+                    f.truncate(len(raw))
+            for line in raw.decode().splitlines():
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("name") is None:
+                    m.pop(rec["face"], None)
+                else:
+                    m[rec["face"]] = rec["name"]
+                self._records += 1
+        return m
+
+    # ---------- reads ----------
+    def get(self, face_id: str, default=None):
+        return self.index.get(face_id, default)
+
+    def __getitem__(self, face_id: str) -> str:
+        return self.index[face_id]
+
+    def __contains__(self, face_id) -> bool:
+        return face_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    # ---------- writes ----------
+    def update(self, mapping: dict[str, str]):
+        self._log([{"face": f, "name": n} for f, n in mapping.items()])
+
+    def __setitem__(self, face_id: str, name: str):
+        self.update({face_id: name})
+
+    def remove(self, *face_ids: str):
+        self._log([{"face": f, "name": None} for f in face_ids if f in self.index])
+
+    def _log(self, recs: list[dict]):
+        m = self.index
+        with self._lock:
+            for r in recs:
+                if r["name"] is None:
+                    m.pop(r["face"], None)
+                else:
+                    m[r["face"]] = r["name"]
+            self._buf.extend(recs)
+            full = len(self._buf) >= self.batch
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Append buffered changes to the journal (one write + fsync); compact when it is long."""
+        with self._lock:
+            if not self._buf:
+                return
+            data = "".join(json.dumps(r) + "\n" for r in self._buf).encode()
+            with open(self.journal, "ab") as f:
+                f.write(data)
+                f.flush(); os.fsync(f.fileno())
+            self._records += len(self._buf)
+            self._buf.clear()
+            compact = self._records >= self.compact_after
+        if compact:
+            self.compact()
+
+    def compact(self):
+        """Fold the journal (and anything still buffered) into the snapshot."""
+        m = self.index
+        with self._lock:
+            _write_atomic(self.snapshot, json.dumps(m, indent=2).encode())
+            self.journal.unlink(missing_ok=True)    # snapshot already holds every record
+            self._records = 0
+            self._buf.clear()
+
+    def stats(self) -> dict:
+        return {"faces": len(self), "journal_records": self._records, "buffered": len(self._buf)}
@@ -1,18 +1,45 @@
-from fastapi import FastAPI, File, UploadFile, Request
-from fastapi.responses import JSONResponse
-import boto3, io, os, json, asyncio, time
+from fastapi import FastAPI, File, UploadFile, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+import boto3, io, os, re, math, asyncio, contextvars, threading, time
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 from pathlib import Path
 from PIL import Image
 from datetime import datetime
+from collections import Counter
+
+from image_ingest import Frame, decode_bgr
+from stage_metrics import prometheus_text, stages
+from recog_cache import RecognitionCache, dhash
+from tg_outbox import Alert, Outbox
+from pending_store import PendingStore
+from name_journal import NameJournal
+from enroll_queue import EnrollJob, EnrollQueue
+from scene_gate import SceneGate, thumbnail
+from camera_sched import Cooldown, FairLimiter
 
 # ---------- AWS / Rekognition ----------
 REGION, COLL = "ap-south-1", "doorcam-family"
-rek = boto3.client("rekognition", region_name=REGION)
+REK_CONCURRENCY = 8          # max boto3 calls in flight (threads + pooled HTTP connections)
+REQUEST_DEADLINE = 10.0      # seconds a /recognize request may take before we give up (504)
+REK_ENDPOINT_URL = os.environ.get("REK_ENDPOINT_URL")   # e.g. bench.fake_services for load tests; None = AWS
+
+# boto3 clients are thread-safe; one client, one connection pool sized to the executor
+rek = boto3.client("rekognition", region_name=REGION, endpoint_url=REK_ENDPOINT_URL,
+                   config=Config(max_pool_connections=REK_CONCURRENCY, retries={"mode": "adaptive"}))
+rek_pool = ThreadPoolExecutor(max_workers=REK_CONCURRENCY, thread_name_prefix="rek")
+
+# ---- cameras: identity comes from X-Camera-Id / ?camera= / the /ingest/{camera} path ----
+CAMERA_WEIGHTS: dict[str, int] = {}   # e.g. {"front": 2}: slots per round-robin turn (default 1, "enroll" = /label)
+MAX_CAMERAS = 64             # distinct camera ids tracked; unknown ones past this share "default"
+_camera = contextvars.ContextVar("camera", default="default")
+# REK_CONCURRENCY slots shared round-robin between cameras with calls waiting
+rek_fair = FairLimiter(REK_CONCURRENCY, CAMERA_WEIGHTS)
 
 # Optional FaceId->name cache (we’ll also use ExternalImageId directly when available)
 NAMES_FN = "face_map.json"
-names = json.load(open(NAMES_FN)) if Path(NAMES_FN).exists() else {}
+names = NameJournal(NAMES_FN)   # snapshot + append-only journal (face_map.jsonl), read on first lookup
 
 # ---------- Telegram ----------
 from telegram import Bot, Update
@@ -20,17 +47,62 @@ from telegram.ext import Application, CommandHandler, ContextTypes
 
 TELEGRAM_BOT_TOKEN = "8424341748:AAGOkB3DVHiePOksp7ZDIzUJ1PAutLHy53I"
 TELEGRAM_CHAT_ID = "1092486083"
+TELEGRAM_BASE_URL = os.environ.get("TELEGRAM_BASE_URL")   # e.g. "http://127.0.0.1:9000/bot"; None = api.telegram.org
 
 PENDING_DIR = Path("images/pending"); PENDING_DIR.mkdir(parents=True, exist_ok=True)
-pending: dict[str, Path] = {}   # token -> image path
+
+# ---- notification outbox: one paced sender instead of a task per face ----
+OUTBOX_MAX = 100             # queued alerts; the oldest is dropped past this
+OUTBOX_WINDOW = 1.5          # seconds to collect faces into one media-group message
+OUTBOX_RATE = 1.0            # messages/s to the chat (Telegram allows ~1/s per chat)
+OUTBOX_BURST = 3             # messages that may go out back to back
+OUTBOX_RETRIES = 4           # resend attempts (RetryAfter honoured, else exponential backoff)
+OUTBOX_SPOOL = None          # e.g. "images/outbox": keep unsent alerts across restarts
+OUTBOX_SPOOL_MAX_AGE = 600   # seconds; older spooled alerts are dropped on restart
+PENDING_TTL = 7 * 86400      # unlabelled crops are deleted after a week...
+PENDING_MAX_ITEMS = 500      # ...or, oldest first, once there are more than this many
+PENDING_MAX_BYTES = 200 << 20   # ...or they take more disk than this
+PENDING_SWEEP_SECONDS = 600  # how often the sweeper runs
+ENROLL_WORKERS = 2           # /label jobs indexed at once; the rest of REK_CONCURRENCY stays with /recognize
+ENROLL_RETRIES = 3           # re-attempts of a failed label job (exponential backoff)
+ENROLL_TILE = 6              # crops of one person tiled into one index_faces call (1 = a call per crop)
+pending = PendingStore(PENDING_DIR, ttl=PENDING_TTL, max_items=PENDING_MAX_ITEMS, max_bytes=PENDING_MAX_BYTES)
 
 # ---- notify & matching knobs ----
 SIM_THRESHOLD = 80           # accept and notify at/above this %
 SEARCH_THRESHOLD = 70        # allow Rekognition to return weaker candidates
 TOPK = 3                     # look at top-3 matches per face
-COOLDOWN_SECONDS = 10        # per-person notify cooldown; set 0 to disable while testing
+COOLDOWN_SECONDS = 60        # per-camera, per-person notify cooldown; set 0 to disable while testing
 MARGIN = 0.18                # expand crop by 18% to include some context
+CROP_MAX_SIDE = 640          # Rekognition only needs ~40px+ faces; bigger crops just cost upload time
+CROP_QUALITY = 88            # JPEG quality for crops sent to Rekognition / Telegram
 DEBUG_NOTIFY = True          # verbose prints for decisions
+TRACE_LOG = None             # e.g. "traces.jsonl": one line per recognition with its stage timings
+stages.trace_log = TRACE_LOG
+
+# ---- local face-presence gate (optional, needs insightface + onnxruntime) ----
+LOCAL_GATE = False           # detect faces locally; skip Rekognition detect_faces entirely
+GATE_DET_SIZE = 320          # detector input; doorway faces are large, 320 is plenty
+GATE_MIN_SCORE = 0.6         # local detections below this confidence are ignored
+LOCAL_EMBED = False          # with LOCAL_GATE, also embed faces locally (better recognition-cache keys)
+
+# ---- hybrid: local gallery first, Rekognition only for ambiguous faces (implies gate + embed) ----
+HYBRID = False               # match against images/known locally before asking Rekognition
+LOCAL_ACCEPT = 0.45          # local cosine at/above this answers without AWS
+LOCAL_REJECT = 0.20          # local cosine below this is unknown without AWS; between the two -> Rekognition
+KNOWN_DIR = Path("images/known")
+
+# ---- scene-change gate: an unchanged doorway reuses the previous result ----
+SCENE_GATE = False           # compare each frame with the camera's last recognised one (opt-in)
+SCENE_THRESHOLD = 5.0        # grey-level change of the worst 8x6 block of the 64x48 thumbnail that counts
+                             # as a new scene; still frames + sensor noise score <= 2, a 60px face >= 10
+SCENE_MAX_REUSE = 30.0       # seconds an unchanged scene's result is reused before recognising again
+
+# ---- recognition cache: repeat frames of the same face reuse the last answer ----
+RECOG_CACHE_TTL = 8.0        # seconds a Rekognition answer is reused; 0 disables the cache
+RECOG_CACHE_SIZE = 256       # LRU bound on cached faces
+CACHE_MAX_BITS = 10          # dHash keys: max differing bits (of 64) to count as the same face
+CACHE_MIN_COS = 0.75         # embedding keys: min cosine to count as the same face
 
 
 
@@ -48,81 +120,173 @@ def _jpeg_under_5mb(jpg_bytes: bytes) -> bytes:
     im.save(buf, "JPEG", quality=85)
     return buf.getvalue()
 
-def crop_bbox(full_img_bytes: bytes, box: dict, margin: float = MARGIN) -> bytes:
+def _crop_rect(size: tuple[int, int], box: dict, margin: float) -> tuple[int, int, int, int]:
+    """Pixel rect of a Rekognition BoundingBox expanded by `margin`, clamped to the frame."""
     from math import floor, ceil
-    with Image.open(io.BytesIO(full_img_bytes)) as im:
-        w, h = im.size
-        left   = max(0.0, box["Left"] - margin * box["Width"])
-        top    = max(0.0, box["Top"]  - margin * box["Height"])
-        right  = min(1.0, box["Left"] + (1 + margin) * box["Width"])
-        bottom = min(1.0, box["Top"]  + (1 + margin) * box["Height"])
-        x1, y1 = int(floor(left * w)),  int(floor(top * h))
-        x2, y2 = int(ceil(right * w)),  int(ceil(bottom * h))
-        face = im.crop((x1, y1, x2, y2))
-        out = io.BytesIO(); face.save(out, "JPEG", quality=90)
-        return out.getvalue()
-
-async def notify_recognized(name: str, crop_jpeg: bytes, similarity: float):
-    if not tg_bot or not TELEGRAM_CHAT_ID:
-        if DEBUG_NOTIFY: print("[notify] tg_bot/chat not set; skipping")
+    w, h = size
+    left   = max(0.0, box["Left"] - margin * box["Width"])
+    top    = max(0.0, box["Top"]  - margin * box["Height"])
+    right  = min(1.0, box["Left"] + (1 + margin) * box["Width"])
+    bottom = min(1.0, box["Top"]  + (1 + margin) * box["Height"])
+    return int(floor(left * w)), int(floor(top * h)), int(ceil(right * w)), int(ceil(bottom * h))
+
+def _encode_crop(face: Image.Image) -> bytes:
+    face.thumbnail((CROP_MAX_SIDE, CROP_MAX_SIDE))
+    out = io.BytesIO(); face.save(out, "JPEG", quality=CROP_QUALITY)
+    return out.getvalue()
+
+# PIL releases the GIL while encoding, so crops of one frame encode in parallel
+crop_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="crop")
+
+def crop_faces(im: Image.Image, boxes: list[dict], margin: float = MARGIN) -> list[bytes]:
+    """JPEG crops of every face box from one decoded frame, encoded in parallel."""
+    faces = [im.crop(_crop_rect(im.size, box, margin)) for box in boxes]
+    if len(faces) == 1:
+        return [_encode_crop(faces[0])]
+    return list(crop_pool.map(_encode_crop, faces))
+
+outbox = Outbox(lambda: tg_bot, int(TELEGRAM_CHAT_ID) if TELEGRAM_CHAT_ID else None,
+                maxsize=OUTBOX_MAX, window=OUTBOX_WINDOW, rate=OUTBOX_RATE, burst=OUTBOX_BURST,
+                retries=OUTBOX_RETRIES, spool_dir=OUTBOX_SPOOL, spool_max_age=OUTBOX_SPOOL_MAX_AGE)
+
+def notify_recognized(name: str, crop_jpeg: bytes, similarity: float):
+    """Queue '<name> is at the door!' with the cropped face."""
+    if not TELEGRAM_CHAT_ID:
+        if DEBUG_NOTIFY: print("[notify] chat not set; skipping")
         return
-    try:
-        payload = _jpeg_under_5mb(crop_jpeg)
-        caption = f"{name} is at the door! ({similarity:.0f}%)"
-        await tg_bot.send_photo(chat_id=int(TELEGRAM_CHAT_ID), photo=payload, caption=caption)
-        if DEBUG_NOTIFY: print("[notify] sent:", caption)
-    except Exception as e:
-        print("[notify] FAILED:", e)
-
-async def ask_to_label(crop_jpeg: bytes, similarity: float | None = None) -> str:
-    """Send the unknown face to Telegram and return its token."""
+    with stages.time("notify_recognized"):
+        # make sure it’s a proper JPEG and under TG limits
+        outbox.put(Alert("recognized", _jpeg_under_5mb(crop_jpeg), f"{name} is at the door! ({similarity:.0f}%)"))
+
+def ask_to_label(crop_jpeg: bytes, similarity: float | None = None, embedding=None) -> str:
+    """Queue the unknown face for Telegram and return its token."""
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
         print("Telegram not configured; skipping ask_to_label()")
         return ""
-    token = uuid4().hex[:8]
-    path = PENDING_DIR / f"{token}.jpg"
-    path.write_bytes(crop_jpeg)
-    caption = f"Unknown face (ID: {token}){f' ~{similarity:.0f}%' if similarity else ''}\n" \
-              f"Reply with:\n/label {token} <Name>\n/ignore {token}"
-    await tg_bot.send_photo(chat_id=TELEGRAM_CHAT_ID, photo=path.read_bytes(), caption=caption)
-    pending[token] = path
+    with stages.time("ask_to_label"):
+        token = uuid4().hex[:8]
+        path = PENDING_DIR / f"{token}.jpg"
+        path.write_bytes(crop_jpeg)
+        caption = f"Unknown face (ID: {token}){f' ~{similarity:.0f}%' if similarity else ''}\n" \
+                  f"Reply with:\n/label {token} <Name>\n/ignore {token}"
+        pending.add(token, path, similarity, embedding)
+        outbox.put(Alert("unknown", crop_jpeg, caption))
     return token
 
-def _names_save():
-    Path(NAMES_FN).write_text(json.dumps(names, indent=2))
-
-async def label_token(token: str, person: str) -> str:
-    """Index the pending crop under ExternalImageId=person; update local map."""
-    path = pending.pop(token, None)
-    if not path or not path.exists():
-        return f"ID {token} not found or already handled."
-
-    payload = _jpeg_under_5mb(path.read_bytes())
-    resp = rek.index_faces(
-        CollectionId=COLL,
-        Image={"Bytes": payload},
-        ExternalImageId=person,
-        MaxFaces=1
-    )
-    face_ids = [r["Face"]["FaceId"] for r in resp.get("FaceRecords", [])]
-    for fid in face_ids:
-        names[fid] = person
-    _names_save()
-    path.unlink(missing_ok=True)
-    return f"Saved as *{person}* ({len(face_ids)} face{'s' if len(face_ids)!=1 else ''} indexed)."
+def _tile(crops: list[bytes], height: int = 320) -> tuple[bytes, list[tuple]]:
+    """Grid of face crops as one JPEG, so one index_faces call can index them all,
+    and each crop's cell as relative (left, top, right, bottom)."""
+    ims = [Image.open(io.BytesIO(c)).convert("RGB") for c in crops]
+    ims = [im.resize((max(1, im.width * height // im.height), height)) for im in ims]
+    cols = math.ceil(math.sqrt(len(ims)))
+    cell = max(im.width for im in ims)
+    sheet = Image.new("RGB", (cols * cell, math.ceil(len(ims) / cols) * height), (128, 128, 128))
+    cells = []
+    for i, im in enumerate(ims):
+        x, y = (i % cols) * cell, (i // cols) * height
+        sheet.paste(im, (x + (cell - im.width) // 2, y))
+        cells.append((x / sheet.width, y / sheet.height, (x + cell) / sheet.width, (y + height) / sheet.height))
+    out = io.BytesIO(); sheet.save(out, "JPEG", quality=90)
+    return _jpeg_under_5mb(out.getvalue()), cells
+
+def _cell_of(box: dict, cells: list[tuple]) -> int | None:
+    """Index of the tile cell holding the centre of a relative BoundingBox."""
+    cx, cy = box["Left"] + box["Width"] / 2, box["Top"] + box["Height"] / 2
+    return next((i for i, (l, t, r, b) in enumerate(cells) if l <= cx < r and t <= cy < b), None)
+
+async def label_tokens(job: EnrollJob) -> str:
+    """Index the job's pending crops under ExternalImageId=person; update local map.
+    Tokens are dropped from the job as they are done, so a retry only redoes the rest."""
+    _camera.set("enroll")             # index_faces calls queue as their own "camera"
+    with stages.trace("label", person=job.person, tokens=len(job.tokens)), stages.time("label_token"):
+        return await _label_tokens(job)
+
+async def _label_tokens(job: EnrollJob) -> str:
+    person, found = job.person, []
+    for token in list(job.tokens):
+        entry = pending.get(token)
+        if entry is None or not entry["path"].exists():
+            job.tokens.remove(token); job.missing.append(token)
+        else:
+            found.append((token, entry["path"]))
+    try:
+        for i in range(0, len(found), ENROLL_TILE):
+            chunk = found[i:i + ENROLL_TILE]
+            crops = [p.read_bytes() for _, p in chunk]
+            if len(crops) > 1:
+                payload, cells = await asyncio.to_thread(_tile, crops)
+            else:
+                payload, cells = _jpeg_under_5mb(crops[0]), [(0.0, 0.0, 1.0, 1.0)]
+            resp = await _rek_call("enroll", "index_faces",
+                CollectionId=COLL,
+                Image={"Bytes": payload},
+                ExternalImageId=person,
+                MaxFaces=len(chunk)
+            )
+            records = resp.get("FaceRecords", [])
+            names.update({r["Face"]["FaceId"]: person for r in records})
+            job.indexed += len(records)
+            hit = {_cell_of(r["Face"]["BoundingBox"], cells) for r in records}
+            for i, ((token, path), crop) in enumerate(zip(chunk, crops)):
+                job.tokens.remove(token)
+                if i not in hit:    # no face indexed from this crop: keep it pending
+                    job.unmatched.append(token)
+                    continue
+                pending.pop(token)
+                if HYBRID:
+                    # keep the local gallery in step with the collection, else this face stays a local unknown
+                    dst = KNOWN_DIR / re.sub(r"[^\w\- ]", "_", person) / f"{token}.jpg"
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    dst.write_bytes(crop)
+                path.unlink(missing_ok=True)
+    finally:
+        await asyncio.to_thread(names.flush)
+    if HYBRID and found and local_gallery is not None:
+        t = asyncio.create_task(asyncio.to_thread(_load_local_gallery))
+        _gallery_refreshes.add(t)
+        t.add_done_callback(_refresh_done)
+
+    n = job.indexed
+    msg = f"Saved as *{person}* ({n} face{'s' if n != 1 else ''} indexed)."
+    if job.missing:
+        msg += f"\nNot found or already handled: {', '.join(job.missing)}"
+    if job.unmatched:
+        msg += f"\nNo face indexed, still pending: {', '.join(job.unmatched)}"
+    return msg
+
+_gallery_refreshes: set[asyncio.Task] = set()   # local gallery reloads after a /label (HYBRID)
+
+def _refresh_done(t: asyncio.Task):
+    _gallery_refreshes.discard(t)
+    if not t.cancelled() and t.exception() is not None:
+        print("[hybrid] local gallery refresh failed:", t.exception())
+
+enroll = EnrollQueue(label_tokens, workers=ENROLL_WORKERS, retries=ENROLL_RETRIES)
 
 # ---------- Telegram command handlers ----------
 async def cmd_label(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.effective_chat: return
     if TELEGRAM_CHAT_ID and str(update.effective_chat.id) != str(TELEGRAM_CHAT_ID):
         return  # ignore other chats
-    if len(context.args) < 2:
-        await update.message.reply_text("Usage: /label <ID> <Name>")
+    # /label <ID> [<ID> ...] <Name>: leading 8-hex args are tokens, the rest is the name
+    args = [a.strip() for a in context.args]
+    tokens = []
+    while len(args) > 1 and re.fullmatch(r"[0-9a-f]{8}", args[0]):
+        tokens.append(args.pop(0))
+    if not tokens or not args:
+        await update.message.reply_text("Usage: /label <ID> [<ID> ...] <Name>")
         return
-    token = context.args[0].strip()
-    person = " ".join(context.args[1:]).strip()
-    msg = await label_token(token, person)
-    await update.message.reply_text(msg, parse_mode="Markdown")
+    person = " ".join(args)
+
+    async def reply(text: str):
+        await update.message.reply_text(text, parse_mode="Markdown")
+    try:
+        ahead = await enroll.submit(EnrollJob(person, tokens, replies=[reply]))
+    except asyncio.QueueFull:
+        await update.message.reply_text("Too many labels queued, try again in a minute.")
+        return
+    await update.message.reply_text(f"Saving {len(tokens)} face{'s' if len(tokens) != 1 else ''} as {person}…"
+                                    + (f" ({ahead} job{'s' if ahead != 1 else ''} ahead)" if ahead else ""))
 
 async def cmd_ignore(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.effective_chat: return
@@ -132,16 +296,19 @@ async def cmd_ignore(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /ignore <ID>")
         return
     token = context.args[0].strip()
-    path = pending.pop(token, None)
+    path = pending.pop(token)
     if path and path.exists(): path.unlink(missing_ok=True)
     await update.message.reply_text(f"Ignored {token}.")
 
 # ---------- FastAPI lifecycle: start/stop the Telegram bot ----------
 @app.on_event("startup")
 async def _startup():
-    global tg_app, tg_bot
+    global tg_app, tg_bot, _sweeper
     if TELEGRAM_BOT_TOKEN:
-        tg_app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        builder = Application.builder().token(TELEGRAM_BOT_TOKEN)
+        if TELEGRAM_BASE_URL:
+            builder = builder.base_url(TELEGRAM_BASE_URL)
+        tg_app = builder.build()
         tg_app.add_handler(CommandHandler("label", cmd_label))
         tg_app.add_handler(CommandHandler("ignore", cmd_ignore))
 
@@ -152,98 +319,421 @@ async def _startup():
 
         tg_bot = tg_app.bot
         print("Telegram bot started (polling).")
+        outbox.start()
     else:
         print("Telegram not configured (set TELEGRAM_BOT_TOKEN / TELEGRAM_CHAT_ID).")
+    if HYBRID:
+        try:
+            await asyncio.to_thread(_load_local_gallery)
+        except Exception as e:   # no local model: every face goes to Rekognition
+            print("[hybrid] local gallery unavailable, using Rekognition only:", e)
+    _sweeper = asyncio.create_task(_sweep_pending())
+
+_sweeper: asyncio.Task | None = None
+
+async def _sweep_pending():
+    while True:
+        try:
+            res = await asyncio.to_thread(pending.sweep)
+            if res["expired"] or res["evicted"]:
+                print("[pending] sweep:", res)
+        except Exception as e:
+            print("[pending] sweep failed:", e)
+        await asyncio.sleep(PENDING_SWEEP_SECONDS)
 
 @app.on_event("shutdown")
 async def _shutdown():
+    if _sweeper:
+        _sweeper.cancel()
+    for t in list(_gallery_refreshes):
+        t.cancel()
+    enroll.stop()
+    await outbox.stop()
+    names.flush()
     if tg_app:
         # 👇 stop polling first, then stop+shutdown the app
         await tg_app.updater.stop()
         await tg_app.stop()
         await tg_app.shutdown()
+    rek_pool.shutdown(wait=False, cancel_futures=True)
+    crop_pool.shutdown(wait=False, cancel_futures=True)
 
-COOLDOWN_SECONDS = 60
-last_notified: dict[str, float] = {}   # name -> unix time
-
-async def notify_recognized(name: str, crop_jpeg: bytes, similarity: float):
-    """Send '<name> is at the door!' with the cropped face."""
-    if not tg_bot or not TELEGRAM_CHAT_ID:
-        return
-    try:
-        # make sure it’s a proper JPEG and under TG limits
-        payload = _jpeg_under_5mb(crop_jpeg)
-        caption = f"{name} is at the door! ({similarity:.0f}%)"
-        await tg_bot.send_photo(
-            chat_id=int(TELEGRAM_CHAT_ID),  # int is safest
-            photo=payload,
-            caption=caption
-        )
-        print("Telegram sent:", caption)
-    except Exception as e:
-        print("Telegram send failed:", e)
+last_notified = Cooldown(max_keys=4096)   # (camera, name) -> unix time, expired entries purged
 
 # ---------- Shared recognition logic ----------
-def run_recognition(img_bytes: bytes) -> dict:
-    det = rek.detect_faces(Image={"Bytes": img_bytes})
-    if not det.get("FaceDetails"):
-        if DEBUG_NOTIFY: print("[recog] no faces")
-        return {"faces": []}
-
-    results = []
-
-    for fd in det["FaceDetails"]:
-        crop = crop_bbox(img_bytes, fd["BoundingBox"])
-
-        srch = rek.search_faces_by_image(
-            CollectionId=COLL,
-            Image={"Bytes": crop},
-            FaceMatchThreshold=SEARCH_THRESHOLD,
-            MaxFaces=TOPK
-        )
-
-        # collapse top-K by name (ExternalImageId preferred)
+async def _rek_call(stage: str, op: str, **kw) -> dict:
+    """Run a blocking boto3 Rekognition call on the bounded executor, off the event loop."""
+    def call():
+        with stages.time(stage):
+            return getattr(rek, op)(**kw)
+    ctx = contextvars.copy_context()      # run_in_executor doesn't carry the request's trace over
+    async with rek_fair.slot(_camera.get()):
+        return await asyncio.get_running_loop().run_in_executor(rek_pool, ctx.run, call)
+
+def _crop_all(frame: Frame, boxes: list[dict], with_hash: bool = False) -> tuple[list[bytes], list]:
+    """JPEG crops of every face, plus a dHash of each tight face box when `with_hash`."""
+    with stages.time("decode"):
+        im = frame.pil()   # decoded once, shared by every face's crop
+    with stages.time("crop"):
+        hashes = [dhash(im.crop(_crop_rect(im.size, b, 0.0))) if with_hash else None for b in boxes]
+        return crop_faces(im, boxes), hashes
+
+_gate_model = None
+_gate_model_error: Exception | None = None
+_gate_model_lock = threading.Lock()
+gate_stats = Counter()       # gated (no face, nothing sent) / forwarded (local boxes used) / fallback
+
+def _local_model():
+    """Loaded once, under a lock; a failed load is remembered instead of retried on every frame."""
+    global _gate_model, _gate_model_error
+    if _gate_model is None:
+        with _gate_model_lock:
+            if _gate_model is None:
+                if _gate_model_error is not None:
+                    raise RuntimeError(f"local face model unavailable: {_gate_model_error}")
+                try:
+                    from face_pipeline import load_model   # optional dependency, only loaded when gating
+                    _gate_model = load_model(det_size=(GATE_DET_SIZE, GATE_DET_SIZE),
+                                             modules=["detection", "recognition"] if LOCAL_EMBED or HYBRID else ["detection"])
+                except Exception as e:
+                    _gate_model_error = e
+                    raise
+    return _gate_model
+
+def _local_faces(frame: Frame) -> tuple[list[dict], list]:
+    """Faces from the local detector: Rekognition-style relative BoundingBoxes and,
+    with LOCAL_EMBED/HYBRID, an embedding per face (else None)."""
+    from face_pipeline import detect, embed
+    model = _local_model()
+    with stages.time("gate"):
+        img, factor = frame.bgr(GATE_DET_SIZE)
+        if img is None:
+            raise ValueError("undecodable frame")
+        h, w = img.shape[:2]
+        faces = [f for f in detect(model, img, fast_size=None) if f.det_score >= GATE_MIN_SCORE]
+        boxes = []
+        for f in faces:
+            x1, y1 = max(0.0, f.bbox[0] / w), max(0.0, f.bbox[1] / h)
+            x2, y2 = min(1.0, f.bbox[2] / w), min(1.0, f.bbox[3] / h)
+            boxes.append({"Left": float(x1), "Top": float(y1), "Width": float(x2 - x1), "Height": float(y2 - y1)})
+    if not (LOCAL_EMBED or HYBRID):
+        return boxes, [None] * len(boxes)
+    with stages.time("embed"):
+        if factor > 1:      # detected on a reduced decode: align crops on every pixel
+            full, _ = frame.bgr()
+            for f in faces:
+                f.bbox = f.bbox * factor
+                if f.kps is not None:
+                    f.kps = f.kps * factor
+            img = full
+        embed(model, [(img, f) for f in faces])
+    return boxes, [f.embedding for f in faces]
+
+async def _face_boxes(frame: Frame) -> tuple[list[dict], list]:
+    """Face boxes (and local embeddings, if any) for the frame: local gate when
+    enabled, fail-open to Rekognition."""
+    if LOCAL_GATE or HYBRID:
+        try:
+            boxes, embs = await asyncio.to_thread(_local_faces, frame)
+        except Exception as e:
+            gate_stats["fallback"] += 1
+            print("[gate] local detector failed, using Rekognition:", e)
+        else:
+            gate_stats["gated" if not boxes else "forwarded"] += 1
+            return boxes, embs
+    det = await _rek_call("detect", "detect_faces", Image={"Bytes": frame.buf})
+    boxes = [fd["BoundingBox"] for fd in det.get("FaceDetails", [])]
+    return boxes, [None] * len(boxes)
+
+# ---- local gallery for HYBRID (embeddings cached like server.py's, in their own dir) ----
+local_store = None
+local_gallery = None
+_local_sync_lock = threading.Lock()
+hybrid_stats = Counter()     # local_accept / local_reject / ambiguous (sent to Rekognition) / no_embedding
+
+def _embed_photo(path: Path):
+    from face_pipeline import detect, embed
+    img, _ = decode_bgr(path.read_bytes(), 2 * GATE_DET_SIZE)
+    if img is None:
+        return None
+    faces = detect(_local_model(), img, max_num=1)
+    embed(_local_model(), [(img, f) for f in faces])
+    return faces[0].embedding if faces else None
+
+def _load_local_gallery() -> dict:
+    """Embed new/changed photos under KNOWN_DIR and swap in a fresh Gallery."""
+    global local_store, local_gallery
+    from face_store import EmbeddingStore
+    from face_match import Gallery
+    with _local_sync_lock:
+        if local_store is None:
+            local_store = EmbeddingStore(str(KNOWN_DIR), "images/.embcache/hybrid", model="buffalo_l")
+        res = local_store.sync(_embed_photo)
+        local_gallery = Gallery(local_store.by_person())   # built fully before the swap
+    print(f"[hybrid] gallery sync: {res}, {len(local_gallery)} people")
+    return res
+
+def _local_match(emb) -> tuple[str, float] | None:
+    """Best local (name, cosine), or None when there is no gallery to match against."""
+    g = local_gallery
+    if g is None or not len(g):
+        return None
+    idx, top = g.search(emb, 1)
+    return g.names[idx[0, 0]], float(top[0, 0])
+
+async def _search(crop: bytes) -> dict[str, float]:
+    """Best similarity per name for one face crop."""
+    srch = await _rek_call("search", "search_faces_by_image",
+        CollectionId=COLL,
+        Image={"Bytes": crop},
+        FaceMatchThreshold=SEARCH_THRESHOLD,
+        MaxFaces=TOPK
+    )
+    # collapse top-K by name (ExternalImageId preferred)
+    with stages.time("match"):
         scores = {}
         for m in srch.get("FaceMatches", []):
             face = m["Face"]
             nm = face.get("ExternalImageId") or names.get(face["FaceId"], "unknown")
             scores[nm] = max(scores.get(nm, 0.0), m["Similarity"])
+    return scores
+
+recog_cache = RecognitionCache(ttl=RECOG_CACHE_TTL, max_entries=RECOG_CACHE_SIZE,
+                               min_cos=CACHE_MIN_COS, max_bits=CACHE_MAX_BITS)
+
+async def _search_cached(crop: bytes, key) -> tuple[dict[str, float], str]:
+    """Scores for one face and where they came from ("cache" or "cloud")."""
+    if RECOG_CACHE_TTL > 0:
+        hit = recog_cache.get(key)
+        if hit is not None:
+            return hit, "cache"
+    scores = await _search(crop)
+    if RECOG_CACHE_TTL > 0:
+        recog_cache.put(key, scores)
+    return scores, "cloud"
+
+async def _recognize_face(crop: bytes, key, emb) -> tuple[dict[str, float], str]:
+    """Scores for one face: local gallery when it is confident either way, else Rekognition.
+    Local scores are cosine x 100 and are already accepted/rejected by LOCAL_ACCEPT/LOCAL_REJECT."""
+    if HYBRID:
+        best = _local_match(emb) if emb is not None else None
+        if best is None:
+            hybrid_stats["no_embedding"] += 1
+        elif best[1] >= LOCAL_ACCEPT:
+            hybrid_stats["local_accept"] += 1
+            return {best[0]: best[1] * 100}, "local"
+        elif best[1] < LOCAL_REJECT:
+            hybrid_stats["local_reject"] += 1
+            return {}, "local"
+        else:
+            hybrid_stats["ambiguous"] += 1
+    return await _search_cached(crop, key)
+
+scene_gate = SceneGate(SCENE_THRESHOLD, SCENE_MAX_REUSE, max_cameras=MAX_CAMERAS)
+
+def _thumbnail(img_bytes: bytes):
+    with stages.time("scene"):
+        return thumbnail(img_bytes)
+
+async def run_recognition(img_bytes: bytes, camera: str = "default") -> dict:
+    """Recognise every face in one frame from `camera`, unless its scene is unchanged."""
+    _camera.set(camera)               # task-local: picks this camera's queue in _rek_call
+    with stages.trace("recognize", camera=camera) as trace_id, stages.time("recognize"):
+        result = await _scene_gated(img_bytes, camera)
+    return {**result, "trace": trace_id} if trace_id else result
+
+async def _scene_gated(img_bytes: bytes, camera: str) -> dict:
+    if not SCENE_GATE:
+        return await _recognize(img_bytes, camera)
+    thumb = await asyncio.to_thread(_thumbnail, img_bytes)
+    cached = scene_gate.check(camera, thumb)
+    if cached is not None:
+        return {**cached, "scene": "unchanged"}
+    result = await _recognize(img_bytes, camera)
+    scene_gate.update(camera, thumb, result)
+    return result
+
+async def _recognize(img_bytes: bytes, camera: str = "default") -> dict:
+    frame = Frame(img_bytes)
+    boxes, embs = await _face_boxes(frame)
+    if not boxes:
+        if DEBUG_NOTIFY: print("[recog] no faces")
+        return {"faces": []}
+
+    with_hash = RECOG_CACHE_TTL > 0 and any(e is None for e in embs)
+    crops, hashes = await asyncio.to_thread(_crop_all, frame, boxes, with_hash)
+    keys = [e if e is not None else h for e, h in zip(embs, hashes)]
+    # every face is searched concurrently: one round-trip per frame, not one per face
+    found = await asyncio.gather(*[_recognize_face(crop, key, emb) for crop, key, emb in zip(crops, keys, embs)])
 
-        if DEBUG_NOTIFY: print("[recog] candidates:", [(k, round(v,1)) for k,v in scores.items()])
+    results = []
+    for crop, emb, (scores, source) in zip(crops, embs, found):
+        if DEBUG_NOTIFY: print(f"[recog] candidates ({source}):", [(k, round(v,1)) for k,v in scores.items()])
 
         if scores:
             best_name, best_sim = max(scores.items(), key=lambda kv: kv[1])
             best_sim = round(best_sim, 2)
-            results.append({"name": best_name, "similarity": best_sim})
+            results.append({"name": best_name, "similarity": best_sim, "source": source})
 
-            if best_name != "unknown" and best_sim >= SIM_THRESHOLD:
-                now = time.time()
-                last = last_notified.get(best_name, 0)
-                cooldown_ok = (now - last) >= COOLDOWN_SECONDS
+            if best_name != "unknown" and (source == "local" or best_sim >= SIM_THRESHOLD):
+                cooldown_ok = last_notified.allow((camera, best_name), COOLDOWN_SECONDS)
                 if DEBUG_NOTIFY:
-                    print(f"[recog] best={best_name}@{best_sim}%, cooldown_ok={cooldown_ok}")
+                    print(f"[recog] {camera}: best={best_name}@{best_sim}%, cooldown_ok={cooldown_ok}")
                 if cooldown_ok:
-                    asyncio.create_task(notify_recognized(best_name, crop, best_sim))
-                    last_notified[best_name] = now
+                    notify_recognized(best_name, crop, best_sim)
             else:
                 if DEBUG_NOTIFY:
                     print(f"[recog] best below threshold or unknown → no notify (best={best_name}, sim={best_sim})")
         else:
-            results.append({"name": "unknown", "similarity": 0})
-            if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
+            results.append({"name": "unknown", "similarity": 0, "source": source})
+            # a cached unknown was already sent for labelling moments ago
+            if source != "cache" and TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
                 if DEBUG_NOTIFY: print("[recog] unknown → ask_to_label()")
-                asyncio.create_task(ask_to_label(crop))
+                ask_to_label(crop, embedding=emb)
 
     return {"faces": results}
 
+# ---- camera identity ----
+ingest_stats: dict[str, Counter] = {"default": Counter()}   # camera -> received / dropped / processed / errors
+
+def _camera_id(req: Request | WebSocket, given: str | None = None) -> str:
+    """Camera id from the path, X-Camera-Id header or ?camera=; anything odd, or a new id past MAX_CAMERAS, is "default"."""
+    cam = given or req.headers.get("x-camera-id") or req.query_params.get("camera") or "default"
+    if not re.fullmatch(r"[\w.-]{1,32}", cam) or cam == "enroll":
+        return "default"
+    if cam not in ingest_stats and len(ingest_stats) >= MAX_CAMERAS:
+        return "default"
+    ingest_stats.setdefault(cam, Counter())
+    return cam
+
+async def _recognize_with_deadline(img_bytes: bytes, camera: str = "default") -> JSONResponse:
+    ingest_stats[camera]["received"] += 1
+    try:
+        return JSONResponse(await asyncio.wait_for(run_recognition(img_bytes, camera), REQUEST_DEADLINE))
+    except asyncio.TimeoutError:
+        print(f"[recog] deadline of {REQUEST_DEADLINE}s exceeded")
+        return JSONResponse({"faces": [], "error": "deadline exceeded"}, status_code=504)
+
+# ---------- Streaming ingest: newest frame per camera wins ----------
+@app.websocket("/ingest/{camera}")
+async def ingest(ws: WebSocket, camera: str):
+    """Persistent frame channel for one camera: the client sends JPEGs as binary messages.
+
+    At most one frame is processed at a time and only the newest frame that
+    arrived meanwhile is kept; superseded frames are dropped before any decode
+    or AWS call, so a result is never older than about two recognition times.
+    Each processed frame is answered with {"seq", "age_ms", "dropped", "faces"}.
+    """
+    await ws.accept()
+    camera = _camera_id(ws, camera)
+    st = ingest_stats[camera]
+    latest: list[tuple[int, bytes, float]] = []      # 0 or 1 waiting frame: (seq, jpeg, received at)
+    ready = asyncio.Event()
+
+    async def process():
+        while True:
+            await ready.wait()
+            ready.clear()
+            seq, buf, t = latest.pop()
+            try:
+                res = await asyncio.wait_for(run_recognition(buf, camera), REQUEST_DEADLINE)
+            except asyncio.TimeoutError:
+                res = {"faces": [], "error": "deadline exceeded"}
+            except Exception as e:
+                st["errors"] += 1
+                res = {"faces": [], "error": str(e)}
+            age = (time.perf_counter() - t) * 1000
+            stages.record("frame_age", age)             # received -> answered
+            st["processed"] += 1
+            await ws.send_json({"seq": seq, "age_ms": round(age, 1), "dropped": st["dropped"], **res})
+
+    worker = asyncio.create_task(process())
+    seq = 0
+    try:
+        while True:
+            buf = await ws.receive_bytes()
+            seq += 1
+            st["received"] += 1
+            if latest:
+                latest.clear()
+                st["dropped"] += 1
+            latest.append((seq, buf, time.perf_counter()))
+            ready.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        worker.cancel()
+
 
 # ---------- Endpoints ----------
+@app.get("/stats")
+async def stats():
+    return {
+        "gate": {"enabled": LOCAL_GATE, **gate_stats,
+                 # every gated or forwarded frame skipped its detect_faces call
+                 "detect_calls_saved": gate_stats["gated"] + gate_stats["forwarded"]},
+        "outbox": outbox.stats(),
+        "pending": pending.stats(),
+        "names": names.stats(),
+        "enroll": enroll.stats(),
+        "scene_gate": {"enabled": SCENE_GATE, **scene_gate.stats()},
+        "recog_cache": {"ttl": RECOG_CACHE_TTL, **recog_cache.stats()},
+        "hybrid": {"enabled": HYBRID, "people": len(local_gallery) if local_gallery is not None else 0,
+                   **hybrid_stats,
+                   # every local accept/reject skipped a search_faces_by_image call
+                   "search_calls_saved": hybrid_stats["local_accept"] + hybrid_stats["local_reject"]},
+        "ingest": {cam: dict(c) for cam, c in ingest_stats.items()},
+        "cameras": {"cooldowns": len(last_notified), **rek_fair.stats()},
+        "stages": stages.summary(),
+    }
+
+def _metric_families() -> list:
+    """/stats as fixed-name Prometheus families; camera ids and outcomes are labels."""
+    by = lambda label, counts: [({label: k}, v) for k, v in counts.items()]
+    one = lambda v: [({}, v)]
+    ob, pend, nm, en, rc = outbox.stats(), pending.stats(), names.stats(), enroll.stats(), recog_cache.stats()
+    fair = rek_fair.stats()
+    return [
+        ("rubudesk_gate_frames_total", "counter", "Frames through the local face gate, by result.", by("result", gate_stats)),
+        ("rubudesk_outbox_depth", "gauge", "Alerts waiting in the Telegram outbox.", one(ob["depth"])),
+        ("rubudesk_outbox_in_flight", "gauge", "Alerts being sent right now.", one(ob["in_flight"])),
+        ("rubudesk_outbox_events_total", "counter", "Outbox alerts/messages, by event.", by("event", outbox.counts)),
+        ("rubudesk_pending_items", "gauge", "Unlabelled crops kept for /label.", one(pend["items"])),
+        ("rubudesk_pending_bytes", "gauge", "Disk used by unlabelled crops.", one(pend["bytes"])),
+        ("rubudesk_pending_oldest_age_seconds", "gauge", "Age of the oldest unlabelled crop.", one(pend["oldest_age_s"])),
+        ("rubudesk_names_faces", "gauge", "FaceIds in the name map.", one(nm["faces"])),
+        ("rubudesk_names_journal_records", "gauge", "Records in the name journal since compaction.", one(nm["journal_records"])),
+        ("rubudesk_enroll_queued", "gauge", "/label jobs waiting.", one(en["queued"])),
+        ("rubudesk_enroll_in_progress", "gauge", "/label jobs being indexed.", one(en["in_progress"])),
+        ("rubudesk_enroll_jobs_total", "counter", "/label jobs, by event.", by("event", enroll.counts)),
+        ("rubudesk_scene_gate_frames_total", "counter", "Frames checked by the scene gate, by event.", by("event", scene_gate.counts)),
+        ("rubudesk_recog_cache_entries", "gauge", "Faces in the recognition cache.", one(rc["size"])),
+        ("rubudesk_recog_cache_lookups_total", "counter", "Recognition cache lookups, by result.",
+         [({"result": "hit"}, rc["hits"]), ({"result": "miss"}, rc["misses"])]),
+        ("rubudesk_recog_cache_removals_total", "counter", "Recognition cache entries removed, by reason.",
+         [({"reason": "evicted"}, rc["evictions"]), ({"reason": "expired"}, rc["expired"])]),
+        ("rubudesk_hybrid_faces_total", "counter", "Faces through the local gallery, by result.", by("result", hybrid_stats)),
+        ("rubudesk_ingest_frames_total", "counter", "Frames per camera, by result.",
+         [({"camera": cam, "result": k}, v) for cam, c in ingest_stats.items() for k, v in c.items()]),
+        ("rubudesk_aws_granted_total", "counter", "Rekognition call slots granted, by camera.", by("camera", fair["granted"])),
+        ("rubudesk_aws_waited_total", "counter", "Rekognition calls that had to queue, by camera.", by("camera", fair["waited"])),
+        ("rubudesk_aws_waiting", "gauge", "Rekognition calls queued now, by camera.", by("camera", fair["waiting"])),
+        ("rubudesk_aws_active", "gauge", "Rekognition calls in flight.", one(fair["active"])),
+        ("rubudesk_aws_capacity", "gauge", "Rekognition calls allowed in flight.", one(fair["capacity"])),
+        ("rubudesk_cooldown_keys", "gauge", "(camera, person) notify cooldowns tracked.", one(len(last_notified))),
+    ]
+
+@app.get("/metrics")  # Prometheus scrape target
+async def metrics():
+    return PlainTextResponse(stages.prometheus() + prometheus_text(_metric_families()),
+                             media_type="text/plain; version=0.0.4")
+
 @app.post("/recognize")  # multipart/form-data
-async def recognize(image: UploadFile = File(...)):
+async def recognize(req: Request, image: UploadFile = File(...)):
     img_bytes = await image.read()
-    return JSONResponse(run_recognition(img_bytes))
+    return await _recognize_with_deadline(img_bytes, _camera_id(req))
 
 @app.post("/recognize-raw")  # raw JPEG body (for ESP32 simple POST)
 async def recognize_raw(req: Request):
     img_bytes = await req.body()
-    return JSONResponse(run_recognition(img_bytes))
+    return await _recognize_with_deadline(img_bytes, _camera_id(req))
@@ -0,0 +1,112 @@
+"""Unknown faces waiting for /label or /ignore, kept in SQLite next to the crops.
+
+    store = PendingStore("images/pending")
+    store.add(token, path, similarity=None, embedding=None)
+    path = store.pop(token)         # /label, /ignore
+    store.sweep()                   # drop expired / over-budget crops
+
+The database is opened on first use. Crops already in the directory with no
+row (left behind by older versions or a crash) are adopted then, with their
+file mtime as timestamp, so they can still be labelled or swept.
+"""
+import sqlite3, threading, time
+from pathlib import Path
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending (
+    token      TEXT PRIMARY KEY,
+    path       TEXT NOT NULL,
+    ts         REAL NOT NULL,
+    similarity REAL,
+    embedding  BLOB,
+    bytes      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS pending_ts ON pending(ts);
+"""
+
+
+class PendingStore:
+    def __init__(self, root: str | Path = "images/pending", db_name: str = "pending.sqlite3",
+                 ttl: float = 7 * 86400, max_items: int = 500, max_bytes: int = 200 << 20):
+        self.root = Path(root)
+        self.db_path = self.root / db_name
+        self.ttl, self.max_items, self.max_bytes = ttl, max_items, max_bytes
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.Lock()      # the sweeper runs in a worker thread
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            db.executescript(SCHEMA)
+            self._db = db
+            n = self._adopt()
+            if n:
+                print(f"[pending] adopted {n} orphaned crop(s) from {self.root}")
+        return self._db
+
+    def _adopt(self) -> int:
+        known = {r[0] for r in self._db.execute("SELECT token FROM pending")}
+        rows = [(p.stem, str(p), p.stat().st_mtime, p.stat().st_size)
+                for p in self.root.glob("*.jpg") if p.stem not in known]
+        self._db.executemany("INSERT INTO pending(token, path, ts, bytes) VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def add(self, token: str, path: Path, similarity: float | None = None, embedding=None):
+        emb = None if embedding is None else np.asarray(embedding, np.float32).tobytes()
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?, ?, ?)",
+                            (token, str(path), time.time(), similarity, emb, path.stat().st_size))
+
+    def get(self, token: str) -> dict | None:
+        with self._lock:
+            row = self.db.execute("SELECT path, ts, similarity, embedding FROM pending WHERE token = ?",
+                                  (token,)).fetchone()
+        if row is None:
+            return None
+        path, ts, sim, emb = row
+        return {"path": Path(path), "ts": ts, "similarity": sim,
+                "embedding": None if emb is None else np.frombuffer(emb, np.float32)}
+
+    def pop(self, token: str) -> Path | None:
+        """Remove the entry and return its crop path (the caller deletes the file)."""
+        with self._lock:
+            row = self.db.execute("SELECT path FROM pending WHERE token = ?", (token,)).fetchone()
+            if row:
+                self.db.execute("DELETE FROM pending WHERE token = ?", (token,))
+        return Path(row[0]) if row else None
+
+    def sweep(self, now: float | None = None) -> dict:
+        """Drop entries past the TTL, then the oldest while over the item/byte budget."""
+        now = time.time() if now is None else now
+        with self._lock:
+            db = self.db
+            rows = db.execute("SELECT token, path, ts, bytes FROM pending ORDER BY ts").fetchall()
+            n, size = len(rows), sum(r[3] for r in rows)
+            expired, evicted = [], []
+            for token, path, ts, b in rows:          # oldest first
+                if ts < now - self.ttl:
+                    expired.append((token, path))
+                elif n > self.max_items or size > self.max_bytes:
+                    evicted.append((token, path))
+                else:
+                    break
+                n -= 1; size -= b
+            db.executemany("DELETE FROM pending WHERE token = ?", [(t,) for t, _ in expired + evicted])
+        for _, path in expired + evicted:
+            Path(path).unlink(missing_ok=True)
+        return {"expired": len(expired), "evicted": len(evicted)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, size, oldest = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0), MIN(ts) FROM pending").fetchone()
+        return {"items": n, "bytes": size, "oldest_age_s": round(time.time() - oldest, 1) if oldest else 0.0}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
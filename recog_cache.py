@@ -0,0 +1,75 @@
+"""Short-lived cache of recognition results, looked up by face similarity.
+
+Someone standing at the door produces many frames of the same face; the
+answer from Rekognition won't change within a few seconds. Entries are
+keyed either by a local face embedding (cosine >= min_cos counts as the
+same face) or by a 64-bit dHash of the crop (<= max_bits differing bits).
+Entries expire `ttl` seconds after the result was fetched (hits do not
+extend it) and the least recently used entry is evicted past `max_entries`.
+"""
+import time
+from collections import OrderedDict
+from itertools import count
+
+import numpy as np
+from PIL import Image
+
+
+def dhash(im: Image.Image, size: int = 8) -> int:
+    """Difference hash: sign of horizontal gradients on a size x size grid."""
+    px = np.asarray(im.convert("L").resize((size + 1, size), Image.BILINEAR), np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class RecognitionCache:
+    def __init__(self, ttl: float = 8.0, max_entries: int = 256, min_cos: float = 0.75, max_bits: int = 10):
+        self.ttl, self.max_entries, self.min_cos, self.max_bits = ttl, max_entries, min_cos, max_bits
+        self._entries: OrderedDict[int, tuple] = OrderedDict()   # id -> (key, value, stored at)
+        self._ids = count()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def _same(self, a, b) -> bool:
+        if isinstance(a, int) != isinstance(b, int):
+            return False
+        if isinstance(a, int):
+            return (a ^ b).bit_count() <= self.max_bits
+        return float(np.dot(a, b)) >= self.min_cos      # keys are stored unit-normalised
+
+    @staticmethod
+    def _norm(key):
+        if isinstance(key, int):
+            return key
+        key = np.asarray(key, np.float32)
+        return key / max(float(np.linalg.norm(key)), 1e-12)
+
+    def _expire(self, now: float):
+        dead = [i for i, (_, _, t) in self._entries.items() if now - t > self.ttl]
+        for i in dead:
+            del self._entries[i]
+        self.expirations += len(dead)
+
+    def get(self, key):
+        """Cached value for a face similar to `key`, or None."""
+        now = time.monotonic()
+        self._expire(now)
+        key = self._norm(key)
+        for i, (k, value, _) in reversed(self._entries.items()):   # most recent first
+            if self._same(key, k):
+                self._entries.move_to_end(i)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._entries[next(self._ids)] = (self._norm(key), value, time.monotonic())
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        looked = self.hits + self.misses
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / looked, 3) if looked else 0.0,
+                "evictions": self.evictions, "expired": self.expirations}
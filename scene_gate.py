@@ -0,0 +1,81 @@
+"""Per-camera scene-change gate: skip recognition when nothing moved.
+
+    gate = SceneGate(threshold=5.0)
+    thumb = thumbnail(jpeg)
+    cached = gate.check(camera, thumb)       # previous result if the scene is unchanged
+    ...
+    gate.update(camera, thumb, result)
+
+Frames are reduced to a small grayscale thumbnail (decoded at 1/8 scale where
+possible, then area-averaged to 64x48). The thumbnail's absolute difference
+against that of the last *recognised* frame is averaged over a GRID x GRID
+grid of blocks and the score is the largest block, so one face entering an
+otherwise still doorway counts as fully as a whole-frame change (a
+whole-frame mean let a 120px face in a 640x480 frame through). Each
+thumbnail's mean brightness is removed first so auto-exposure drift doesn't
+count as motion. Comparing with the last recognised frame rather than the
+previous one means slow changes still add up and trigger eventually.
+"""
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from image_ingest import decode_gray
+
+THUMB = (64, 48)
+GRID = 8            # 8x8 blocks of 8x6 thumbnail pixels; a 60px face at 640x480 fills about one
+
+
+def thumbnail(buf, size: tuple[int, int] = THUMB) -> np.ndarray | None:
+    """Mean-removed float32 grayscale thumbnail of a JPEG, or None if undecodable."""
+    import cv2
+    img, _ = decode_gray(buf, 4 * size[0])
+    if img is None:
+        return None
+    t = cv2.resize(img, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+    return t - t.mean()
+
+
+def change_score(a: np.ndarray, b: np.ndarray, grid: int = GRID) -> float:
+    """Largest per-block mean absolute difference between two thumbnails (grey levels)."""
+    h, w = a.shape
+    d = np.abs(a - b)[:h - h % grid, :w - w % grid]
+    return float(d.reshape(grid, h // grid, grid, w // grid).mean(axis=(1, 3)).max())
+
+
+class SceneGate:
+    def __init__(self, threshold: float = 5.0, max_reuse: float = 30.0, max_cameras: int = 64):
+        self.threshold = threshold      # block change score (0-255 grey levels) that counts as a change
+        self.max_reuse = max_reuse      # seconds a result may be reused before forcing a fresh one
+        self.max_cameras = max_cameras
+        self._ref: OrderedDict[str, tuple[np.ndarray, dict, float]] = OrderedDict()
+        self.counts = Counter()         # checked / skipped / changed
+
+    def check(self, camera: str, thumb: np.ndarray | None) -> dict | None:
+        """The cached result when `thumb` matches the camera's reference frame, else None."""
+        self.counts["checked"] += 1
+        ref = self._ref.get(camera)
+        if thumb is None or ref is None or ref[0].shape != thumb.shape:
+            return None
+        ref_thumb, result, t = ref
+        if time.monotonic() - t > self.max_reuse:
+            return None
+        if change_score(thumb, ref_thumb) > self.threshold:
+            self.counts["changed"] += 1
+            return None
+        self.counts["skipped"] += 1
+        return result
+
+    def update(self, camera: str, thumb: np.ndarray | None, result: dict):
+        if thumb is None:
+            return
+        self._ref[camera] = (thumb, result, time.monotonic())
+        self._ref.move_to_end(camera)
+        while len(self._ref) > self.max_cameras:
+            self._ref.popitem(last=False)
+
+    def stats(self) -> dict:
+        checked = self.counts["checked"]
+        return {**self.counts, "cameras": len(self._ref),
+                "skip_rate": round(self.counts["skipped"] / checked, 3) if checked else 0.0}
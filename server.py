@@ -1,48 +1,256 @@
 # requirements:
 #   fastapi uvicorn[standard] insightface==0.7 onnxruntime opencv-python
 
-import os, glob, cv2, numpy as np
-from fastapi import FastAPI, UploadFile, File
-from insightface.app import FaceAnalysis      # state-of-the-art toolkit :contentReference[oaicite:1]{index=1}
+import os, asyncio, shutil, numpy as np
+from pathlib import Path
+from uuid import uuid4
+from fastapi import FastAPI, UploadFile, File, Form, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
 import numpy as np
 
+from face_store import EmbeddingStore, IMAGE_EXTS
+from face_match import Gallery, cos_to_dist
+from ann_index import IVFIndex
+from face_pipeline import load_model, run_jobs
+from face_track import FaceTracker
+from image_ingest import decode_bgr
+from stage_metrics import stages
+from infer_sched import InferenceScheduler
+from worker_pool import WorkerPool, PoolBusy
+
 app = FastAPI()
 
 # ---- prepare detector & embedder ----
-fa = FaceAnalysis(name='buffalo_l', providers=['CPUExecutionProvider'])
-fa.prepare(ctx_id=0, det_size=(640, 640))
+WORKERS = int(os.environ.get("RECOG_WORKERS", 0))    # >0: run the model in this many processes
+WORKER_THREADS = int(os.environ.get("RECOG_WORKER_THREADS", 0)) or None   # ONNX threads each (default cores/N)
+
+DET_SIZE = 640         # full-resolution detector input
+DET_FAST_SIZE = 320    # cheap first pass; frames with no face stop here (0 = always full)
+SMALL_FACE_PX = 20     # faces smaller than this in the fast pass trigger the full pass
+DECODE_TARGET = 640    # decode JPEGs at 1/2, 1/4, 1/8 scale while the long side stays >= this (0 = full)
+DETECT_KW = {"fast_size": DET_FAST_SIZE or None, "small_face_px": SMALL_FACE_PX}
+
+# in pool mode the web process only needs a model to embed new gallery photos
+_fa = None
+def get_fa():
+    global _fa
+    if _fa is None:
+        _fa = load_model(det_size=(DET_SIZE, DET_SIZE))
+    return _fa
 
 # ---- load gallery (a few clear photos per person in /known/<name>/) ----
-gallery = {}
-for person in os.listdir("images/known"):
-    embs = []
-    for p in glob.glob(f"images/known/{person}/*"):
-        faces = fa.get(cv2.imread(p))
-        if faces: embs.append(faces[0].embedding)
-    gallery[person] = np.mean(embs, axis=0)
-
-# ---- inference endpoint ----
-@app.post("/recognize")
-async def recognize(image: UploadFile = File(...)):
-    img = np.frombuffer(await image.read(), np.uint8)
-    img = cv2.imdecode(img, cv2.IMREAD_COLOR)
+# per-photo embeddings are cached on disk; only new/changed photos hit the model
+store = EmbeddingStore("images/known", "images/.embcache", model="buffalo_l")
+
+_loop: asyncio.AbstractEventLoop | None = None   # set once serving
+
+def _embed_file(path):
+    img, _ = decode_bgr(path.read_bytes(), 2 * DET_SIZE)   # phone photos: no need for 4000px
+    if img is None: return None
+    if _loop is not None:   # live enrollment: reuse the scheduler/pool, not a second model
+        faces = asyncio.run_coroutine_threadsafe(sched.submit(("analyze", img)), _loop).result()
+    else:
+        faces = get_fa().get(img)
+    return faces[0].embedding if faces else None
+
+MATCH_DIST = 0.6       # max euclidean distance between unit embeddings to accept
+TOPK = 3               # ranked candidates returned per face
+ANN_MIN_ROWS = 5000    # below this many prototype rows exact matmul search is used
+ANN_NPROBE = 16        # min IVF lists scanned per query
+ANN_PROBE_FRAC = 0.05  # ...or this share of the lists (nlist ~ 4*sqrt(rows)); target recall@5 >= 0.95:
+                       # bench.ann_bench --probe-frac 0.05: 0.995 at 10k rows (p99 0.5 ms vs 1.5 brute),
+                       # 0.965 at 100k (p99 4 ms vs 32 brute)
+BATCH_WINDOW_MS = 10   # how long the scheduler waits to fill a batch (added latency)
+BATCH_MAX = 8          # max frames per batched inference call
+GALLERY_WATCH_SECONDS = 0   # >0: poll images/known this often and apply changes live
+TRACK_IOU = 0.3        # min IoU (vs motion-predicted box) to continue a track
+TRACK_CONFIRM_EVERY = 15   # re-embed a tracked face every N frames to confirm identity
+TRACK_MAX_MISSED = 10  # frames a track survives without a detection
+
+def _make_gallery(prev: Gallery | None = None) -> Gallery:
+    g = Gallery(store.by_person())   # one prototype row per photo + centroid
+    if len(g.matrix) <= ANN_MIN_ROWS:
+        return g
+    # index is tied to the cached matrix snapshot it was built from
+    fn = store.cache_dir / f"ivf-{store.snapshot}.npz"
+    if fn.exists():
+        g.index = IVFIndex.load(fn)
+        g.index.nprobe, g.index.probe_frac = ANN_NPROBE, ANN_PROBE_FRAC
+        return g
+    g.index = IVFIndex(nprobe=ANN_NPROBE, exact_max=ANN_MIN_ROWS, probe_frac=ANN_PROBE_FRAC)
+    if prev is not None and prev.index is not None and prev.index.trained:
+        # live update: keep the trained centroids, only re-bucket the rows
+        g.index.centroids, g.index.nlist = prev.index.centroids, prev.index.nlist
+        g.index.add(g.matrix, np.arange(len(g.matrix)))
+    else:
+        g.index.build(g.matrix)
+    for old in store.cache_dir.glob("ivf-*.npz"): old.unlink(missing_ok=True)
+    g.index.save(fn)
+    return g
+
+print("[gallery] sync:", store.sync(_embed_file))
+gallery = _make_gallery()
+
+# ---- inference: a process pool, or one model thread with micro-batched requests ----
+if WORKERS > 0:
+    sched = WorkerPool(WORKERS, WORKER_THREADS, det_size=(DET_SIZE, DET_SIZE), detect_kw=DETECT_KW)
+else:
+    sched = InferenceScheduler(lambda jobs: run_jobs(get_fa(), jobs, **DETECT_KW), BATCH_WINDOW_MS, BATCH_MAX)
+
+_reload_lock = asyncio.Lock()
+_watcher: asyncio.Task | None = None
+
+async def _reload(reason: str) -> dict:
+    """Re-sync the store and swap in a freshly built gallery.
+
+    Only new/changed photos are embedded. The new Gallery is fully built
+    before the global is rebound, so requests in flight keep matching
+    against the old one.
+    """
+    global gallery
+    async with _reload_lock:
+        res = await asyncio.to_thread(store.sync, _embed_file)
+        if res["embedded"] or res["dropped"]:
+            gallery = await asyncio.to_thread(_make_gallery, gallery)
+            print(f"[gallery] {reason}: {res}, {len(gallery)} people")
+        return res
+
+async def _watch_gallery():
+    while True:
+        await asyncio.sleep(GALLERY_WATCH_SECONDS)
+        try:
+            await _reload("watcher")
+        except Exception as e:
+            print("[gallery] watcher failed:", e)
+
+@app.on_event("startup")
+async def _startup():
+    global _loop, _watcher
+    await sched.start()
+    if WORKERS == 0:
+        await asyncio.to_thread(get_fa)     # load the model now, not on the first request
+    _loop = asyncio.get_running_loop()
+    if GALLERY_WATCH_SECONDS > 0:
+        _watcher = asyncio.create_task(_watch_gallery())
+
+@app.on_event("shutdown")
+async def _shutdown():
+    if _watcher: _watcher.cancel()
+    await sched.stop()
+
+# ---- inference endpoints ----
+def _identify(faces) -> list[dict]:
+    """Match embedded faces against the current gallery; one result per face."""
+    if not faces:
+        return []
+    # single read of the global: enrollment swaps in a new Gallery, never mutates one
+    with stages.time("match"):
+        ranked = gallery.match(np.stack([f.embedding for f in faces]), k=TOPK)
     results = []
-    for face in fa.get(img):
-        emb  = face.embedding / np.linalg.norm(face.embedding)
-        best_name, best_dist = "unknown", 1.0
-        for name, ref in gallery.items():
-            dist = np.linalg.norm(emb - ref / np.linalg.norm(ref))
-            if dist < best_dist:
-                best_name, best_dist = name, dist
-        if best_dist < 0.6:
-            results.append(
-                {
-                    "name": best_name,
-                    "dist": float(round(best_dist, 3))  # 👈 cast to Python float
-                }
-            )
+    for cands in ranked:
+        top = [{"name": n, "dist": float(round(cos_to_dist(c), 3))} for n, c in cands]
+        if top and top[0]["dist"] < MATCH_DIST:
+            results.append({**top[0], "candidates": top})
         else:
-            results.append({"name": "unknown"})
+            results.append({"name": "unknown", "candidates": top})
+    return results
+
+def _decode(buf):
+    with stages.time("decode"):
+        return decode_bgr(buf, DECODE_TARGET or None)
+
+async def _recognize_bytes(buf) -> JSONResponse:
+    img, _ = await asyncio.to_thread(_decode, buf)
+    if img is None:
+        return JSONResponse({"error": "undecodable image"}, status_code=400)
+    try:
+        faces = await sched.submit(("analyze", img))
+    except PoolBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+    return JSONResponse({"faces": _identify(faces)})
+
+@app.post("/recognize")  # multipart/form-data
+async def recognize(image: UploadFile = File(...)):
+    return await _recognize_bytes(await image.read())
+
+@app.post("/recognize-raw")  # raw JPEG body, no multipart parsing or extra copy
+async def recognize_raw(req: Request):
+    return await _recognize_bytes(await req.body())
+
+@app.websocket("/stream")
+async def stream(ws: WebSocket):
+    """Continuous recognition: client sends JPEG frames as binary messages.
+
+    Faces are tracked across frames; only new tracks (and every
+    TRACK_CONFIRM_EVERY frames, existing ones) are embedded and matched.
+    Each frame is answered with {"frame", "faces": [{"track", "bbox", "embedded", ...}]}.
+    """
+    await ws.accept()
+    tracker = FaceTracker(TRACK_IOU, TRACK_CONFIRM_EVERY, TRACK_MAX_MISSED)
+    embedded = 0
+    try:
+        while True:
+            buf = await ws.receive_bytes()
+            img, factor = await asyncio.to_thread(_decode, buf)
+            if img is None:
+                await ws.send_json({"frame": tracker.frame, "error": "undecodable frame"})
+                continue
+            try:
+                faces = await sched.submit(("detect", img))
+                assoc = tracker.update([f.bbox for f in faces])
+                due = [i for i, (_, need) in enumerate(assoc) if need]
+                embedded_faces = await sched.submit(("embed", img, [faces[i] for i in due])) if due else []
+            except PoolBusy as e:
+                await ws.send_json({"frame": tracker.frame, "error": str(e)})
+                continue
+            for i, ident in zip(due, _identify(embedded_faces)):
+                tracker.identified(assoc[i][0], ident)
+            embedded += len(due)
+            await ws.send_json({
+                "frame": tracker.frame,
+                "faces": [{"track": t.id, "bbox": [round(float(v) * factor, 1) for v in f.bbox],
+                           "embedded": need, **t.identity} for f, (t, need) in zip(faces, assoc)],
+                "embedded_total": embedded,
+            })
+    except WebSocketDisconnect:
+        pass
+
+# ---- enrollment ----
+def _valid_name(name: str) -> bool:
+    return bool(name) and Path(name).name == name and not name.startswith(".")
+
+@app.post("/enroll")
+async def enroll(name: str = Form(...), images: list[UploadFile] = File(...)):
+    """Add photos for `name` (new or existing person) and apply them live."""
+    name = name.strip()
+    if not _valid_name(name):
+        return JSONResponse({"error": "invalid name"}, status_code=400)
+    folder = store.root / name
+    folder.mkdir(parents=True, exist_ok=True)
+    saved = []
+    for up in images:
+        ext = Path(up.filename or "").suffix.lower()
+        path = folder / f"{uuid4().hex[:8]}{ext if ext in IMAGE_EXTS else '.jpg'}"
+        path.write_bytes(await up.read())
+        saved.append(path.relative_to(store.root).as_posix())
+    res = await _reload(f"enroll {name}")
+    with_face = sum(store.entries.get(rel, {}).get("row", -1) >= 0 for rel in saved)
+    return {"name": name, "added": len(saved), "with_face": with_face, "sync": res}
+
+@app.delete("/enroll/{name}")
+async def unenroll(name: str):
+    """Remove a person's photos folder and drop them from the gallery."""
+    folder = store.root / name
+    if not _valid_name(name) or not folder.is_dir():
+        return JSONResponse({"error": f"{name} not enrolled"}, status_code=404)
+    await asyncio.to_thread(shutil.rmtree, folder)
+    return {"removed": name, "sync": await _reload(f"remove {name}")}
+
+@app.get("/health")
+async def health():
+    return {"ok": True}
 
-    return JSONResponse({"faces": results})
+@app.get("/stats")
+async def stats():
+    return {"mode": "pool" if WORKERS > 0 else "thread", "scheduler": sched.stats(),
+            "stages": stages.summary(), "gallery": {"people": len(gallery), "rows": len(gallery.matrix)}}
@@ -1,48 +1,173 @@
-import boto3, glob, hashlib, json, os, io
+"""Bulk-index images/known/<person>/* into the Rekognition collection.
+
+    python setup_rek.py                 # index everything not in index_cache.json yet
+    python setup_rek.py --dry-run       # only report what would be uploaded
+    python setup_rek.py --workers 16
+
+Files are hashed in parallel and anything whose sha1 is already in the cache
+is skipped. Uploads run on a bounded thread pool whose in-flight cap adapts
+to throttling (halved on a throttle, grown back one step at a time);
+throttled calls are retried here, not by botocore, so the cap sees them.
+The cache is rewritten atomically after every indexed photo, and Ctrl-C
+waits for the uploads already running and records them, so a rerun never
+uploads a photo twice.
+"""
+import argparse, io, json, os, threading, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from PIL import Image
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+from face_store import IMAGE_EXTS, sha1_file
+from image_ingest import decode_pil
 
 REGION   = "ap-south-1"
 COLL_ID  = "doorcam-family"
 BASE_DIR = "images/known"                 # folders per person
 CACHE_FN = "index_cache.json"
+THROTTLE_CODES = {"ThrottlingException", "ProvisionedThroughputExceededException", "LimitExceededException"}
+TRANSIENT_CODES = {"InternalServerError", "ServiceUnavailable", "ServiceUnavailableException", "RequestTimeout"}
 
-rek = boto3.client("rekognition", region_name=REGION)
-cache = json.loads(Path(CACHE_FN).read_text()) if Path(CACHE_FN).exists() else {}
-
-def sha1(path):
-    h = hashlib.sha1()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
 
 def shrink(path, max_side=1280, q=85):
-    im = Image.open(path)
+    im, _ = decode_pil(Path(path).read_bytes(), max_side)   # draft-mode decode: big photos decode at 1/2-1/8
     im.thumbnail((max_side, max_side))
     buf = io.BytesIO()
     im.save(buf, "JPEG", quality=q)
     return buf.getvalue()
 
-for person in os.listdir(BASE_DIR):
-    for img_path in glob.glob(f"{BASE_DIR}/{person}/*.jpg"):
-        h = sha1(img_path)
-        if h in cache:
-            print(f"◎  skip (already indexed) {img_path}")
+
+def save_cache(cache: dict, fn: str = CACHE_FN):
+    tmp = Path(fn + ".tmp")
+    tmp.write_text(json.dumps(cache, indent=2))
+    os.replace(tmp, fn)
+
+
+class Throttle:
+    """AIMD cap on in-flight calls: halved on throttling, +1 after `limit` clean calls."""
+
+    def __init__(self, max_inflight: int):
+        self.max = self.limit = max_inflight
+        self.inflight = self.clean = 0
+        self.cv = threading.Condition()
+
+    def acquire(self):
+        with self.cv:
+            self.cv.wait_for(lambda: self.inflight < self.limit)
+            self.inflight += 1
+
+    def release(self, throttled: bool):
+        with self.cv:
+            self.inflight -= 1
+            if throttled:
+                self.limit, self.clean = max(1, self.limit // 2), 0
+            else:
+                self.clean += 1
+                if self.clean >= self.limit and self.limit < self.max:
+                    self.limit, self.clean = self.limit + 1, 0
+            self.cv.notify_all()
+
+
+def index_one(rek, throttle: Throttle, path: Path, person: str, retries: int = 6) -> dict:
+    payload = shrink(path)
+    for attempt in range(retries + 1):
+        throttle.acquire()
+        throttled = False
+        try:
+            resp = rek.index_faces(
+                CollectionId=COLL_ID,
+                Image={"Bytes": payload},
+                ExternalImageId=person,
+                MaxFaces=1
+            )
+            recs = resp["FaceRecords"]
+            # no face is cached too, so the photo is not re-uploaded on every run
+            return {"face_id": recs[0]["Face"]["FaceId"] if recs else None, "person": person}
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            throttled = code in THROTTLE_CODES
+            transient = code in TRANSIENT_CODES or e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+            if not (throttled or transient) or attempt == retries:
+                raise
+        except (BotoConnectionError, HTTPClientError):   # endpoint unreachable, connect/read timeouts, resets
+            if attempt == retries:
+                raise
+        finally:
+            throttle.release(throttled)
+        time.sleep(min(30.0, 0.5 * 2 ** attempt))
+
+
+def scan(base_dir: str, hash_workers: int) -> list[tuple[Path, str, str]]:
+    """(path, person, sha1) for every photo, hashed in parallel."""
+    files = [(p, d.name) for d in sorted(Path(base_dir).iterdir()) if d.is_dir()
+             for p in sorted(d.iterdir()) if p.suffix.lower() in IMAGE_EXTS]
+    with ThreadPoolExecutor(hash_workers) as pool:   # hashlib releases the GIL
+        hashes = list(pool.map(sha1_file, [p for p, _ in files]))
+    return [(p, person, h) for (p, person), h in zip(files, hashes)]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dry-run", action="store_true", help="list what would be uploaded, call nothing")
+    ap.add_argument("--workers", type=int, default=8, help="max index_faces calls in flight")
+    ap.add_argument("--hash-workers", type=int, default=os.cpu_count() or 4)
+    ap.add_argument("--base-dir", default=BASE_DIR)
+    args = ap.parse_args()
+
+    cache = json.loads(Path(CACHE_FN).read_text()) if Path(CACHE_FN).exists() else {}
+    t0 = time.perf_counter()
+    photos = scan(args.base_dir, args.hash_workers)
+    todo, seen = [], set(cache)
+    for p, person, h in photos:
+        if h in seen:
             continue
+        seen.add(h)                                 # same photo in two places: upload once
+        todo.append((p, person, h))
+    print(f"◎  {len(photos)} photos hashed in {time.perf_counter() - t0:.1f}s, "
+          f"{len(photos) - len(todo)} already indexed, {len(todo)} to upload")
+
+    if args.dry_run:
+        for person, n in sorted(Counter(person for _, person, _ in todo).items()):
+            mb = sum(p.stat().st_size for p, who, _ in todo if who == person) / 2**20
+            print(f"   {person:<12} {n:>5} photos  {mb:8.1f} MB on disk")
+        return
+
+    # one attempt per boto3 call: index_one's retry loop is the only one, so Throttle sees every throttle
+    rek = boto3.client("rekognition", region_name=REGION,
+                       config=Config(max_pool_connections=args.workers, retries={"mode": "standard", "max_attempts": 1}))
+    throttle = Throttle(args.workers)
+    done = failed = 0
+    pool = ThreadPoolExecutor(args.workers)
+    futs = {pool.submit(index_one, rek, throttle, p, person): (p, person, h) for p, person, h in todo}
+    try:
+        for fut in as_completed(futs):
+            p, person, h = futs[fut]
+            try:
+                cache[h] = fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"✗  {p}: {e}")
+                continue
+            done += 1
+            save_cache(cache)       # small atomic rewrite, cheap next to the AWS call
+            print(f"✓  {person:<8} → {cache[h]['face_id'] or 'no face'}  ({done}/{len(todo)}, cap {throttle.limit})")
+    except KeyboardInterrupt:
+        print("interrupted; waiting for uploads in progress, queued ones are dropped")
+        pool.shutdown(wait=True, cancel_futures=True)
+        # calls that were already running have created faces: record them or the next run duplicates them
+        for fut, (p, person, h) in futs.items():
+            if fut.done() and not fut.cancelled() and fut.exception() is None and h not in cache:
+                cache[h] = fut.result()
+                done += 1
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        save_cache(cache)
+    print(f"👍  indexed {done} new, {failed} failed, {len(cache)} total unique images "
+          f"in {time.perf_counter() - t0:.1f}s")
+
 
-        payload = shrink(img_path)
-        resp = rek.index_faces(
-            CollectionId=COLL_ID,
-            Image={"Bytes": payload},
-            ExternalImageId=person,
-            MaxFaces=1
-        )
-        for rec in resp["FaceRecords"]:
-            face_id = rec["Face"]["FaceId"]
-            cache[h] = {"face_id": face_id, "person": person}
-            print(f"✓  {person:<8} → {face_id}")
-
-# save the updated cache
-Path(CACHE_FN).write_text(json.dumps(cache, indent=2))
-print(f"👍  indexed {len(cache)} total unique images")
+if __name__ == "__main__":
+    main()
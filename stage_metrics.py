@@ -0,0 +1,135 @@
+"""Per-stage wall-clock timing shared by the recognition servers.
+
+    with stages.time("detect"):
+        ...
+    print(stages.prometheus())          # histograms in Prometheus text format
+    print(prometheus_text([("app_frames_total", "counter", "Frames seen.", [({"camera": "front"}, 12)])]))
+
+Samples are kept in a bounded ring per stage for percentiles and also counted
+into fixed histogram buckets (process-local: stages run in worker processes
+are recorded there, not in the web process).
+
+With `trace_log` set, `with stages.trace("recognize") as trace_id:` collects
+every stage timed inside it (also in threads started with a copied context)
+and appends one JSON line per trace: {"trace", "name", "ts", "ms", "spans"}.
+"""
+import contextvars, json, threading, time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from uuid import uuid4
+
+import numpy as np
+
+# histogram upper bounds in ms (Prometheus exposes seconds)
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_current = contextvars.ContextVar("stage_trace", default=None)
+
+
+class _Trace:
+    __slots__ = ("id", "t0", "spans", "closed")
+
+    def __init__(self):
+        self.id, self.t0, self.spans, self.closed = uuid4().hex[:16], time.perf_counter(), [], False
+
+
+class StageTimer:
+    def __init__(self, keep: int = 10000, trace_log: str | None = None):
+        self.keep = keep
+        self.samples: dict[str, deque] = defaultdict(lambda: deque(maxlen=self.keep))
+        self.hist: dict[str, list] = {}    # stage -> [bucket counts..., +Inf count, sum ms]
+        self.trace_log = trace_log
+        self._log_lock = threading.Lock()
+
+    def record(self, stage: str, ms: float):
+        self.samples[stage].append(ms)
+        h = self.hist.get(stage)
+        if h is None:
+            h = self.hist[stage] = [0] * (len(BUCKETS_MS) + 2)
+        h[bisect_left(BUCKETS_MS, ms)] += 1
+        h[-1] += ms
+
+    @contextmanager
+    def time(self, stage: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.record(stage, (end - t) * 1000)
+            tr = _current.get()
+            if tr is not None and not tr.closed:
+                tr.spans.append((stage, round((t - tr.t0) * 1000, 3), round((end - t) * 1000, 3)))
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Collect the stages timed inside into one JSONL record; yields the trace id (None when off)."""
+        if not self.trace_log:
+            yield None
+            return
+        tr = _Trace()
+        token = _current.set(tr)
+        try:
+            yield tr.id
+        finally:
+            _current.reset(token)
+            tr.closed = True      # tasks spawned inside (notifications) keep the context; stop recording
+            rec = {"trace": tr.id, "name": name, "ts": round(time.time(), 3),
+                   "ms": round((time.perf_counter() - tr.t0) * 1000, 3), **attrs,
+                   "spans": [{"stage": s, "start_ms": a, "ms": d} for s, a, d in tr.spans]}
+            line = json.dumps(rec) + "\n"
+            with self._log_lock, open(self.trace_log, "a") as f:
+                f.write(line)
+
+    def summary(self) -> dict[str, dict]:
+        out = {}
+        for stage, s in self.samples.items():
+            if not s:
+                continue
+            a = np.fromiter(s, float)
+            p50, p95, p99 = np.percentile(a, [50, 95, 99])
+            out[stage] = {"n": len(a), "mean_ms": round(a.mean(), 3), "p50_ms": round(p50, 3),
+                          "p95_ms": round(p95, 3), "p99_ms": round(p99, 3)}
+        return out
+
+    def prometheus(self, metric: str = "stage_duration_seconds") -> str:
+        """Every stage as a cumulative histogram, Prometheus text exposition format."""
+        lines = [f"# HELP {metric} Wall-clock time per processing stage.", f"# TYPE {metric} histogram"]
+        for stage, h in sorted(self.hist.items()):
+            cum = 0
+            for le, n in zip([*(f"{b / 1000:g}" for b in BUCKETS_MS), "+Inf"], h[:-1]):
+                cum += n
+                lines.append(f'{metric}_bucket{{stage="{_escape(stage)}",le="{le}"}} {cum}')
+            lines.append(f'{metric}_sum{{stage="{_escape(stage)}"}} {h[-1] / 1000:.6f}')
+            lines.append(f'{metric}_count{{stage="{_escape(stage)}"}} {cum}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        self.samples.clear()
+        self.hist.clear()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(families: list[tuple[str, str, str, list[tuple[dict, float]]]]) -> str:
+    """Metric families (name, "counter" | "gauge", help, [(labels, value), ...]) in text format.
+
+    Names are fixed and anything variable (camera ids, outcomes) goes in
+    escaped label values, so each family has one HELP/TYPE header and no two
+    series can collide. Families without samples are left out.
+    """
+    lines = []
+    for name, kind, help_, samples in families:
+        if not samples:
+            continue
+        lines += [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            lab = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{lab}}} {value}" if lab else f"{name} {value}")
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+stages = StageTimer()
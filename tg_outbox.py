@@ -0,0 +1,204 @@
+"""Telegram notification outbox: one sender, bounded queue, paced and retried.
+
+    outbox = Outbox(lambda: tg_bot, chat_id)
+    outbox.put(Alert("recognized", jpeg, "Amrut is at the door!"))
+
+Alerts queued within `window` seconds of each other go out as one
+sendMediaGroup (up to 10 photos) instead of one sendPhoto each. Sends are
+paced by a token bucket below Telegram's per-chat limit (~1 msg/s, short
+bursts allowed); RetryAfter is honoured and other failures are retried with
+exponential backoff. When the queue is full the oldest alert is dropped.
+With `spool_dir` every queued alert is also written to disk until it is
+sent, and anything left over is re-queued when the next Outbox is created:
+alerts older than `spool_max_age` seconds are dropped, the rest go out with
+their capture time in the caption.
+"""
+import asyncio, contextlib, json, os, time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from uuid import uuid4
+
+from stage_metrics import stages
+
+MAX_GROUP = 10          # Telegram's media-group limit
+
+
+@dataclass
+class Alert:
+    kind: str           # "recognized" | "unknown"
+    photo: bytes
+    caption: str
+    id: str = field(default_factory=lambda: uuid4().hex[:12])
+    created: float = field(default_factory=time.time)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.t = float(burst), time.monotonic()
+
+    async def take(self, n: float = 1.0):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.t) * self.rate)
+            self.t = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return
+            await asyncio.sleep((n - self.tokens) / self.rate)
+
+
+def _retry_after(e: Exception) -> float | None:
+    ra = getattr(e, "retry_after", None)      # telegram.error.RetryAfter (int or timedelta)
+    if ra is None:
+        return None
+    return ra.total_seconds() if hasattr(ra, "total_seconds") else float(ra)
+
+
+class Outbox:
+    def __init__(self, get_bot, chat_id, maxsize: int = 100, window: float = 1.5, rate: float = 1.0,
+                 burst: int = 3, retries: int = 4, backoff: float = 1.0, spool_dir: str | Path | None = None,
+                 spool_max_age: float = 3600.0):
+        self.get_bot, self.chat_id = get_bot, chat_id
+        self.maxsize, self.window, self.retries, self.backoff = maxsize, window, retries, backoff
+        self.bucket = TokenBucket(rate, burst)
+        self.spool, self.spool_max_age = (Path(spool_dir) if spool_dir else None), spool_max_age
+        self._q: deque[Alert] = deque()
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._in_flight = 0
+        self.counts = Counter()     # queued / sent / photos / retries / failed / dropped / expired
+        if self.spool:
+            self._restore()         # before any put(), so a fresh alert's spool file isn't queued twice
+
+    # ---------- producer side ----------
+    def put(self, alert: Alert):
+        """Queue an alert (never blocks; drops the oldest when full)."""
+        if len(self._q) >= self.maxsize:
+            old = self._q.popleft()
+            self._unspool(old)
+            self.counts["dropped"] += 1
+        self._spool(alert)
+        self._q.append(alert)
+        self.counts["queued"] += 1
+        self._ready.set()
+        self.start()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="tg-outbox")
+
+    async def stop(self, drain_timeout: float = 2.0):
+        """Give queued alerts `drain_timeout` seconds to go out, then stop the sender."""
+        t = time.monotonic() + drain_timeout
+        while not self.idle() and time.monotonic() < t:
+            await asyncio.sleep(0.05)
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    def idle(self) -> bool:
+        return not self._q and not self._in_flight
+
+    # ---------- sender ----------
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._q:
+                self._ready.clear()
+                await self._ready.wait()
+            # let a burst of faces collect, then send them together
+            # (polled: asyncio.wait_for can swallow a cancel that races its timeout on 3.11)
+            end = loop.time() + self.window
+            while len(self._q) < MAX_GROUP and (left := end - loop.time()) > 0:
+                await asyncio.sleep(min(left, 0.05))
+            batch = [self._q.popleft() for _ in range(min(MAX_GROUP, len(self._q)))]
+            self._in_flight = len(batch)
+            try:
+                await self._deliver(batch)
+            finally:
+                self._in_flight = 0
+
+    async def _deliver(self, batch: list[Alert]):
+        bot = self.get_bot()
+        if bot is None:
+            self.counts["unconfigured"] += len(batch)
+            for a in batch:
+                self._unspool(a)
+            return
+        for attempt in range(self.retries + 1):
+            await self.bucket.take()
+            try:
+                with stages.time("notify"):
+                    await self._send(bot, batch)
+            except Exception as e:
+                wait = _retry_after(e)
+                if attempt == self.retries:
+                    self.counts["failed"] += len(batch)
+                    print(f"[outbox] giving up on {len(batch)} alert(s):", e)
+                    return          # left in the spool (if any) for the next start
+                self.counts["retries"] += 1
+                await asyncio.sleep(wait if wait is not None else self.backoff * 2 ** attempt)
+            else:
+                now = time.time()
+                for a in batch:
+                    stages.record("outbox_delay", (now - a.created) * 1000)   # queued -> delivered
+                    self._unspool(a)
+                self.counts["sent"] += 1
+                self.counts["photos"] += len(batch)
+                return
+
+    async def _send(self, bot, batch: list[Alert]):
+        if len(batch) == 1:
+            return await bot.send_photo(chat_id=self.chat_id, photo=batch[0].photo, caption=batch[0].caption)
+        from telegram import InputMediaPhoto
+        media = [InputMediaPhoto(a.photo, caption=a.caption) for a in batch]
+        return await bot.send_media_group(chat_id=self.chat_id, media=media)
+
+    # ---------- persistence ----------
+    def _spool(self, a: Alert):
+        if not self.spool:
+            return
+        self.spool.mkdir(parents=True, exist_ok=True)
+        (self.spool / f"{a.id}.jpg").write_bytes(a.photo)
+        meta = {"kind": a.kind, "caption": a.caption, "id": a.id, "created": a.created}
+        tmp = self.spool / f"{a.id}.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.spool / f"{a.id}.json")   # the .json appears only once the photo is on disk
+
+    def _unspool(self, a: Alert):
+        if self.spool:
+            for ext in (".json", ".jpg"):
+                (self.spool / f"{a.id}{ext}").unlink(missing_ok=True)
+
+    def _restore(self):
+        metas = []
+        if not self.spool.is_dir():
+            return
+        for fn in self.spool.glob("*.json"):
+            try:
+                meta = json.loads(fn.read_text())
+                metas.append((meta, (self.spool / f"{meta['id']}.jpg").read_bytes()))
+            except (OSError, ValueError, KeyError):
+                fn.unlink(missing_ok=True)
+        now, kept = time.time(), 0
+        for meta, photo in sorted(metas, key=lambda m: m[0]["created"]):
+            a = Alert(photo=photo, **meta)
+            if now - a.created > self.spool_max_age:
+                self._unspool(a)        # a doorbell alert from hours ago is noise, not news
+                self.counts["expired"] += 1
+                continue
+            a.caption = f"[{time.strftime('%H:%M:%S', time.localtime(a.created))}, sent late] {a.caption}"
+            self._q.append(a)
+            kept += 1
+        if metas:
+            print(f"[outbox] re-queued {kept} unsent alert(s), dropped {len(metas) - kept} older than "
+                  f"{self.spool_max_age:.0f}s")
+        if kept:
+            self._ready.set()
+
+    def stats(self) -> dict:
+        """Queue depth and counters; send time and queue delay are the notify/outbox_delay stages."""
+        return {"depth": len(self._q), "in_flight": self._in_flight, **self.counts}
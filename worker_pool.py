@@ -0,0 +1,205 @@
+"""Process pool of insightface workers for using every core of the box.
+
+Each worker process holds its own buffalo_l model with a fixed ONNX
+intra-op thread count and runs face_pipeline jobs (decoded frame in,
+detected and/or embedded faces out). Matching stays in the web process against its single gallery
+matrix, so workers never hold (or copy) the gallery.
+
+Faces cross the process boundary as plain dicts of arrays/floats
+(insightface's Face doesn't survive pickling) and are rebuilt on the
+other side.
+
+Backpressure: every worker has `slots` in-flight frames; a submit waits up
+to `queue_timeout` for a free slot, and again for a ready worker, and then
+raises PoolBusy. A monitor restarts workers that die or sit on a frame
+longer than `task_timeout`, failing the frames they held.
+"""
+import asyncio, itertools, multiprocessing as mp, os, queue, threading, time
+
+
+class PoolBusy(Exception):
+    pass
+
+
+FACE_FIELDS = ("bbox", "kps", "det_score", "embedding")
+
+
+def faces_to_wire(faces) -> list[dict]:
+    return [{k: f.get(k) for k in FACE_FIELDS if f.get(k) is not None} for f in faces]
+
+
+def faces_from_wire(items: list[dict]) -> list:
+    from insightface.app.common import Face
+    return [Face(**d) for d in items]
+
+
+def _worker_main(wid: int, det_size, detect_kw: dict, threads: int, tasks, results):
+    from face_pipeline import load_model, run_jobs
+    fa = load_model(det_size, threads)
+    results.put(("ready", wid, os.getpid()))
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        tid, job = task
+        if job[0] == "embed":
+            job = (*job[:2], faces_from_wire(job[2]))
+        try:
+            results.put(("ok", tid, faces_to_wire(run_jobs(fa, [job], **detect_kw)[0])))
+        except Exception as e:
+            results.put(("err", tid, repr(e)))
+
+
+class _Worker:
+    def __init__(self, wid: int):
+        self.wid = wid
+        self.proc: mp.Process | None = None
+        self.tasks = self.results = None
+        self.ready = False
+        self.inflight: dict[int, tuple[asyncio.Future, float]] = {}   # tid -> (future, sent at)
+        self.done = self.failed = self.restarts = 0
+        self.generation = 0
+
+
+class WorkerPool:
+    def __init__(self, n_workers: int, threads_per_worker: int | None = None, slots: int = 2,
+                 det_size=(640, 640), detect_kw: dict | None = None, queue_timeout: float = 5.0,
+                 task_timeout: float = 30.0, health_interval: float = 1.0):
+        self.n = n_workers
+        self.threads = threads_per_worker or max(1, (os.cpu_count() or 1) // n_workers)
+        self.slots, self.det_size, self.detect_kw = slots, det_size, detect_kw or {}
+        self.queue_timeout, self.task_timeout, self.health_interval = queue_timeout, task_timeout, health_interval
+        self._ctx = mp.get_context("spawn")
+        self._workers = [_Worker(i) for i in range(n_workers)]
+        self._tids = itertools.count()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._free: asyncio.Semaphore | None = None
+        self._any_ready: asyncio.Event | None = None
+        self._monitor: asyncio.Task | None = None
+        self._waiting = 0
+        self.rejected = 0
+
+    # ---------- lifecycle ----------
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._free = asyncio.Semaphore(self.n * self.slots)
+        self._any_ready = asyncio.Event()
+        for w in self._workers:
+            self._spawn(w)
+        self._monitor = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._monitor:
+            self._monitor.cancel()
+        for w in self._workers:
+            w.generation += 1                 # stops the reader thread
+            if w.proc and w.proc.is_alive():
+                w.tasks.put(None)
+        for w in self._workers:
+            if w.proc:
+                await asyncio.to_thread(w.proc.join, 5)
+                if w.proc.is_alive(): w.proc.kill()
+
+    def _spawn(self, w: _Worker):
+        w.generation += 1
+        w.ready = False
+        w.tasks, w.results = self._ctx.Queue(), self._ctx.Queue()
+        w.proc = self._ctx.Process(target=_worker_main, daemon=True, name=f"face-worker-{w.wid}",
+                                   args=(w.wid, self.det_size, self.detect_kw, self.threads, w.tasks, w.results))
+        w.proc.start()
+        threading.Thread(target=self._read, args=(w, w.generation, w.results), daemon=True).start()
+
+    def _read(self, w: _Worker, generation: int, results):
+        """Per-worker reader thread: hands results back to the event loop."""
+        while w.generation == generation:
+            try:
+                msg = results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            except Exception as e:            # a result that won't unpickle: its frame times out
+                print(f"[pool] worker {w.wid}: unreadable result: {e!r}")
+                continue
+            self._loop.call_soon_threadsafe(self._on_message, w, generation, msg)
+
+    def _on_message(self, w: _Worker, generation: int, msg):
+        if generation != w.generation:
+            return
+        kind, key, payload = msg
+        if kind == "ready":
+            w.ready = True
+            self._any_ready.set()
+            print(f"[pool] worker {w.wid} ready (pid {payload}, {self.threads} threads)")
+            return
+        fut, _ = w.inflight.pop(key, (None, 0))
+        if fut is None or fut.done():
+            return
+        if kind == "ok":
+            w.done += 1
+            fut.set_result(faces_from_wire(payload))
+        else:
+            w.failed += 1
+            fut.set_exception(RuntimeError(f"worker {w.wid}: {payload}"))
+
+    def _restart(self, w: _Worker, reason: str):
+        print(f"[pool] restarting worker {w.wid}: {reason}")
+        if w.proc and w.proc.is_alive():
+            w.proc.kill()
+        for fut, _ in w.inflight.values():
+            if not fut.done():
+                fut.set_exception(RuntimeError(f"worker {w.wid} {reason}"))
+        w.failed += len(w.inflight)
+        w.inflight.clear()
+        w.restarts += 1
+        self._spawn(w)
+        if not any(x.ready for x in self._workers):
+            self._any_ready.clear()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for w in self._workers:
+                if not w.proc.is_alive():
+                    self._restart(w, f"died (exit {w.proc.exitcode})")
+                elif any(now - sent > self.task_timeout for _, sent in w.inflight.values()):
+                    self._restart(w, f"stuck > {self.task_timeout:.0f}s")
+
+    # ---------- dispatch ----------
+    async def submit(self, job):
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._free.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PoolBusy(f"all {self.n * self.slots} worker slots busy")
+        finally:
+            self._waiting -= 1
+        try:
+            try:
+                await asyncio.wait_for(self._any_ready.wait(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise PoolBusy("no worker ready")
+            w = min((x for x in self._workers if x.ready), key=lambda x: len(x.inflight))
+            tid = next(self._tids)
+            fut = self._loop.create_future()
+            w.inflight[tid] = (fut, time.monotonic())
+            if job[0] == "embed":             # ("embed", img, faces): faces go over as plain data too
+                job = (*job[:2], faces_to_wire(job[2]))
+            w.tasks.put((tid, job))
+            return await fut
+        finally:
+            self._free.release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": [{"id": w.wid, "pid": w.proc.pid if w.proc else None, "alive": bool(w.proc and w.proc.is_alive()),
+                         "ready": w.ready, "in_flight": len(w.inflight), "done": w.done,
+                         "failed": w.failed, "restarts": w.restarts} for w in self._workers],
+            "threads_per_worker": self.threads,
+            "slots": self.n * self.slots,
+            "queue_depth": self._waiting,
+            "rejected": self.rejected,
+        }